@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+
+from wqutilities.processing_engine.plugin_base import BaseCollectorPlugin
+from wqutilities.processing_engine.plugin_loader import PluginLoader
+
+
+class TestIniPluginConfig(unittest.TestCase):
+    def setUp(self):
+        self._plugin_dir = tempfile.TemporaryDirectory()
+        self.plugin_dir = self._plugin_dir.name
+
+    def tearDown(self):
+        self._plugin_dir.cleanup()
+
+    def load_config(self, file_name, ini_text):
+        with open(os.path.join(self.plugin_dir, file_name), 'w') as ini_file:
+            ini_file.write(ini_text)
+        loader = PluginLoader(self.plugin_dir, [], BaseCollectorPlugin)
+        return loader.load_plugin_configs()
+
+    def test_plugin_keys_go_into_config(self):
+        configs = self.load_config('ndbc.ini',
+                                   "[ndbc]\n"
+                                   "module = NDBCCollector\n"
+                                   "enabled = false\n"
+                                   "timeout = 10\n"
+                                   "station = 41004\n"
+                                   "url = https://www.ndbc.noaa.gov\n")
+        plugin_config = configs['NDBCCollector']
+        self.assertFalse(plugin_config.enabled)
+        self.assertEqual(plugin_config.timeout, 10)
+        self.assertEqual(plugin_config.config, {'station': '41004', 'url': 'https://www.ndbc.noaa.gov'})
+
+    def test_config_section(self):
+        configs = self.load_config('usgs.ini',
+                                   "[DEFAULT]\n"
+                                   "module = USGSCollector\n"
+                                   "retry_count = 5\n"
+                                   "[config]\n"
+                                   "site_id = 02172040\n")
+        plugin_config = configs['USGSCollector']
+        self.assertEqual(plugin_config.retry_count, 5)
+        self.assertEqual(plugin_config.config, {'site_id': '02172040'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,21 +1,115 @@
-from wqutilities import logging
+import logging
+import logging.config
+import queue
+import threading
+import multiprocessing
 
 from yapsy.IPlugin import IPlugin
-from multiprocessing import Process
 
 logger = logging.getLogger(__name__)
 
+#Logging config shared by every plugin, initialize_plugin() only fills in the log file name.
+_BASE_LOG_CFG = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'f': {
+            'format': "%(asctime)s,%(levelname)s,%(funcName)s,%(lineno)d,%(message)s",
+            'datefmt': '%Y-%m-%d %H:%M:%S'
+        }
+    },
+    'handlers': {
+        'stream': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'f',
+            'level': logging.DEBUG
+        },
+        'file_handler': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': None,
+            'formatter': 'f',
+            'level': logging.DEBUG
+        }
+    },
+    'root': {
+        'handlers': ['file_handler'],
+        'level': logging.NOTSET,
+        'propagate': False
+    }
+}
+
 
-class DataCollectorPlugin(IPlugin, Process):
-    def __init__(self):
-        Process.__init__(self)
+class DataCollectorPlugin(IPlugin):
+    """
+    Base for data collector plugins. run() executes on a worker started by start(), either a
+    thread (mode='thread') or a separate process (mode='process'). I/O bound plugins should use
+    threads, which skips forking the interpreter and pickling everything passed through the queues.
+    A process applies logging_config before run(). A thread logs through the host's logging,
+    which run() must not reconfigure.
+    """
+    def __init__(self, mode='process'):
         IPlugin.__init__(self)
+        if mode not in ('thread', 'process'):
+            raise ValueError("mode must be 'thread' or 'process', got: %s" % (mode))
+        self._mode = mode
+        if mode == 'thread':
+            self._runner = threading.Thread(target=self.run, name=self.__class__.__name__)
+        else:
+            self._runner = multiprocessing.Process(target=self._run_process, name=self.__class__.__name__)
         self._logger = logger
         self._plugin_details = None
         self._logging_client_cfg = None
         self._input_queue = None
         self._output_queue = None
 
+    @property
+    def mode(self):
+        return self._mode
+
+    #name and daemon were settable when this class was a Process, so they're forwarded both ways.
+    @property
+    def name(self):
+        return self._runner.name
+
+    @name.setter
+    def name(self, name):
+        self._runner.name = name
+
+    @property
+    def daemon(self):
+        return self._runner.daemon
+
+    @daemon.setter
+    def daemon(self, daemon):
+        self._runner.daemon = daemon
+
+    def __getattr__(self, name):
+        """
+        Anything else a plugin used from Process, terminate(), kill(), pid, exitcode and so on,
+        comes from the runner. In thread mode only what threading.Thread has is available.
+        """
+        if name.startswith('__') or name == '_runner':
+            raise AttributeError(name)
+        return getattr(self._runner, name)
+
+    def create_queue(self):
+        """
+        Returns a queue suited to the run mode, a plain queue.Queue for threads, which passes
+        objects by reference, or a multiprocessing.Queue for processes.
+        """
+        if self._mode == 'thread':
+            return queue.Queue()
+        return multiprocessing.Queue()
+
+    def start(self):
+        self._runner.start()
+
+    def join(self, timeout=None):
+        self._runner.join(timeout)
+
+    def is_alive(self):
+        return self._runner.is_alive()
+
     @property
     def input_queue(self):
       return self._input_queue
@@ -27,34 +121,20 @@ class DataCollectorPlugin(IPlugin, Process):
         self._plugin_details = kwargs['details']
         base_logfile_name = kwargs['logfile_name']
         self.logging_config = {
-            'version': 1,
-            'disable_existing_loggers': False,
-            'formatters': {
-                'f': {
-                    'format': "%(asctime)s,%(levelname)s,%(funcName)s,%(lineno)d,%(message)s",
-                    'datefmt': '%Y-%m-%d %H:%M:%S'
-                }
-            },
+            **_BASE_LOG_CFG,
             'handlers': {
-                'stream': {
-                    'class': 'logging.StreamHandler',
-                    'formatter': 'f',
-                    'level': logging.DEBUG
-                },
-                'file_handler': {
-                    'class': 'logging.handlers.RotatingFileHandler',
-                    'filename': base_logfile_name,
-                    'formatter': 'f',
-                    'level': logging.DEBUG
-                }
-            },
-            'root': {
-                'handlers': ['file_handler'],
-                'level': logging.NOTSET,
-                'propagate': False
+                **_BASE_LOG_CFG['handlers'],
+                'file_handler': {**_BASE_LOG_CFG['handlers']['file_handler'], 'filename': base_logfile_name}
             }
         }
 
+    def _run_process(self):
+        #Only in the child process, in the host it would replace the application's root logging.
+        logging_config = getattr(self, 'logging_config', None)
+        if logging_config is not None:
+            logging.config.dictConfig(logging_config)
+        self.run()
+
     def run(self):
         raise Exception("Must be implemented by child.")
 
@@ -1,18 +1,37 @@
 #Class borrowed from here: http://www.pastequestion.com/blog/python/send-email-with-attachments-using-python.html
 
-import smtplib, os, atexit
-from wqutilities.email import MIMEMultipart
-from wqutilities.email import MIMEBase
-from wqutilities.email import MIMEText
-from wqutilities.email import COMMASPACE, formatdate
-from wqutilities.email import encoders as Encoders
+import smtplib, os, atexit, time, threading, functools, base64
+from email.message import EmailMessage, MIMEPart
+from email.utils import COMMASPACE, formatdate
+from email import policy
 
 class ConnectionError(smtplib.SMTPException): pass
 class LoginError(smtplib.SMTPException): pass
 class DisconnectionError(smtplib.SMTPException): pass
 class EmailSendError(smtplib.SMTPException): pass
  
- 
+@functools.lru_cache(maxsize=16)
+def encode_attachment(file, mtime_ns):
+  '''
+  Reads and base64 encodes the file. Cached on (file, mtime) so the same attachment going out
+  on repeated sends is only read and encoded once.
+  '''
+  with open(file, "rb") as attachment_file:
+    return base64.encodebytes(attachment_file.read()).decode('ascii')
+
+
+def build_attachment(file, mtime_ns):
+  '''
+  Builds a new MIME part around the cached encoded file. Each message gets its own part since
+  the part becomes part of the message tree, only the encoded text is shared.
+  '''
+  part = MIMEPart()
+  part['Content-Type'] = 'application/octet-stream'
+  part['Content-Transfer-Encoding'] = 'base64'
+  part.add_header('Content-Disposition', 'attachment', filename=os.path.basename(file))
+  part.set_payload(encode_attachment(file, mtime_ns))
+  return part
+
 
 class smtpClass:
  
@@ -28,8 +47,8 @@ class smtpClass:
     self._rcpt_to     = None               
     self._server      = None         
     self._attachments = []
-  
-    atexit.register(self.close) #our close() method will be automatically executed upon normal interpreter termination
+    self._messages_sent = 0
+    self.idle_since   = time.monotonic()
   
     self.connect()
   
@@ -56,12 +75,53 @@ class smtpClass:
   
   def close(self):                  
     if self._server:
+      server = self._server
+      self._server = None
       try:
-        self._server.quit()    
+        server.quit()    
       except smtplib.SMTPException as e:
         raise DisconnectionError("Disconnection failed!")
   
   
+  def is_connected(self):
+    #Probe the session with a NOOP, a 421 or a dropped socket means we need to reconnect.
+    if self._server is None:
+      return False
+    try:
+      status, msg = self._server.noop()
+    except (smtplib.SMTPServerDisconnected, OSError) as e:
+      return False
+    return status == 250
+  
+  
+  def reconnect(self):
+    try:
+      self.close()
+    except DisconnectionError as e:
+      pass
+    self._messages_sent = 0
+    self.connect()
+  
+  
+  @property
+  def server_key(self):
+    return (self._host, self._port, self._user, self._use_tls)
+  
+  
+  @property
+  def messages_sent(self):
+    return self._messages_sent
+  
+  
+  def reset(self):
+    #Clear the per message state so the connection can be reused for the next message.
+    self._message     = None
+    self._subject     = None
+    self._from_addr   = None
+    self._rcpt_to     = None
+    self._attachments = []
+  
+  
   def message(self, message):
     self._message = message
   
@@ -79,41 +139,72 @@ class smtpClass:
   
   
   def attach(self, file):
-    if os.path.exists(file):
-            self._attachments.append(file)
+    try:
+      file_stat = os.stat(file)
+    except OSError as e:
+      return
+    self._attachments.append(build_attachment(file, file_stat.st_mtime_ns))
   
   
   def load_attachments(self, m_message):
-    for file in self._attachments:
-      part = MIMEBase('application', "octet-stream")
-      part.set_payload(open(file,"rb").read())
-      Encoders.encode_base64(part)
-      part.add_header('Content-Disposition', 'attachment; filename="%s"' % os.path.basename(file))
-      m_message.attach(part)    
+    if self._attachments:
+      m_message.make_mixed()
+      for part in self._attachments:
+        m_message.attach(part)    
   
     return m_message
   
   
-  def send(self, content_type='plain', charset='UTF-8'):
+  def build_message(self, content_type='plain', charset='UTF-8'):
+    m_message             = EmailMessage()
   
-    if all([self._message, self._subject, self._from_addr, self._rcpt_to]):                                  
-      m_message             = MIMEMultipart()
+    m_message['From']     = self._from_addr
+    m_message['To']       = COMMASPACE.join(self._rcpt_to)
+    m_message['Date']     = formatdate(localtime=True)
+    m_message['Subject']  = self._subject
+    m_message['X-Mailer'] = "Python X-Mailer"
+  
+    m_message.set_content(self._message, subtype=content_type, charset=charset)
   
-      m_message['From']     = self._from_addr
-      m_message['To']       = COMMASPACE.join(self._rcpt_to)
-      m_message['Date']     = formatdate(localtime=True)
-      m_message['Subject']  = self._subject
-      m_message['X-Mailer'] = "Python X-Mailer"
+    return self.load_attachments(m_message)
   
-      m_message.attach(MIMEText(self._message, content_type, charset))
   
-      m_message = self.load_attachments(m_message)
+  def send(self, content_type='plain', charset='UTF-8'):
+  
+    if all([self._message, self._subject, self._from_addr, self._rcpt_to]):                                  
+      m_message = self.build_message(content_type, charset)
   
       try:
-              self._server.sendmail(self._from_addr, self._rcpt_to, m_message.as_string())       
+              #send_message serializes straight to bytes rather than building an intermediate string.
+              self._server.send_message(m_message, self._from_addr, self._rcpt_to)       
+              self._messages_sent += 1
   
+      except smtplib.SMTPServerDisconnected as e:
+              #Let the caller decide whether to reconnect and retry.
+              raise e
       except smtplib.SMTPException as e:
               raise EmailSendError("Email has not been sent")
+  
+  
+  def send_batch(self, messages, failed=None):
+    '''
+    Sends each (from_addr, rcpt_to, message) tuple as its own transaction on the current
+    connection. A failed transaction is reset by smtplib so the rest of the batch can still go out.
+    :param messages: List of (from_addr, rcpt_to, message) tuples, message is the serialized email.
+    :param failed: Optional list the failures are appended to.
+    :return: List of (index, exception) tuples for the messages that failed.
+    '''
+    if failed is None:
+      failed = []
+    for ndx, (from_addr, rcpt_to, message) in enumerate(messages):
+      try:
+        self._server.sendmail(from_addr, rcpt_to, message)
+        self._messages_sent += 1
+      except smtplib.SMTPServerDisconnected as e:
+        raise e
+      except smtplib.SMTPException as e:
+        failed.append((ndx, EmailSendError("Email has not been sent: %s" % (e))))
+    return failed
 
 def get_email_settings_from_ini(config_file: str):
   import configparser
@@ -138,6 +229,86 @@ def get_email_settings_from_ini(config_file: str):
   return email_settings
 
 
+class SMTPConnectionPool:
+  '''
+  Bounded pool of smtpClass connections per server so concurrent callers don't each pay
+  the connect/TLS/login cost, or serialize on a single socket.
+  '''
+  def __init__(self, max_size=5, max_messages=100, max_idle=100):
+    self._max_size     = max_size      #Connections per server.
+    self._max_messages = max_messages  #Messages sent before a connection is rotated.
+    self._max_idle     = max_idle      #Seconds a connection can sit unused before we reconnect.
+    self._available    = threading.Condition(threading.Lock())
+    self._idle         = {}
+    self._open         = {}
+
+  def _key(self, email_settings: {}):
+    return (email_settings['host'], email_settings['port'], email_settings['username'], email_settings['use_tls'])
+
+  def _stale(self, smtp):
+    return (smtp.messages_sent >= self._max_messages or
+            time.monotonic() - smtp.idle_since > self._max_idle or
+            not smtp.is_connected())
+
+  def acquire(self, email_settings: {}):
+    '''
+    Returns a connected smtpClass for the server in email_settings, blocking if max_size
+    connections to that server are already in use.
+    :param email_settings:
+    :return:
+    '''
+    key = self._key(email_settings)
+    with self._available:
+      idle = self._idle.setdefault(key, [])
+      while not idle and self._open.get(key, 0) >= self._max_size:
+        self._available.wait()
+      smtp = None
+      if idle:
+        smtp = idle.pop()
+      else:
+        self._open[key] = self._open.get(key, 0) + 1
+    try:
+      if smtp is None:
+        smtp = smtpClass(host=email_settings['host'],
+                         user=email_settings['username'],
+                         password=email_settings['password'],
+                         port=email_settings['port'],
+                         use_tls=email_settings['use_tls'])
+      elif self._stale(smtp):
+        smtp.reconnect()
+    except Exception as e:
+      self._discard(key)
+      raise e
+    return smtp
+
+  def release(self, smtp):
+    smtp.reset()
+    smtp.idle_since = time.monotonic()
+    with self._available:
+      self._idle.setdefault(smtp.server_key, []).append(smtp)
+      self._available.notify_all()
+
+  def _discard(self, key):
+    with self._available:
+      self._open[key] -= 1
+      self._available.notify_all()
+
+  def close(self):
+    with self._available:
+      for key, idle in self._idle.items():
+        for smtp in idle:
+          try:
+            smtp.close()
+          except smtplib.SMTPException as e:
+            pass
+          self._open[key] -= 1
+        idle.clear()
+      self._available.notify_all()
+
+smtp_pool = SMTPConnectionPool()
+atexit.register(smtp_pool.close)
+
+
 def email_results(email_settings: {}, subject: str, message: str, mime_type='plain', attachment=None):
   '''
 
@@ -150,18 +321,57 @@ def email_results(email_settings: {}, subject: str, message: str, mime_type='pla
   '''
   try:
     # Now send the email.
-    smtp = smtpClass(host=email_settings['host'],
-                     user=email_settings['username'],
-                     password=email_settings['password'],
-                     port=email_settings['port'],
-                     use_tls=email_settings['use_tls'])
-    smtp.rcpt_to(email_settings['to_addresses'])
-    smtp.from_addr(email_settings['from_address'])
-    smtp.subject(subject)
-    smtp.message(message)
-    if attachment is not None:
-      smtp.attach(attachment)
-    smtp.send(content_type=mime_type)
+    smtp = smtp_pool.acquire(email_settings)
+    try:
+      smtp.rcpt_to(email_settings['to_addresses'])
+      smtp.from_addr(email_settings['from_address'])
+      smtp.subject(subject)
+      smtp.message(message)
+      if attachment is not None:
+        smtp.attach(attachment)
+      try:
+        smtp.send(content_type=mime_type)
+      except smtplib.SMTPServerDisconnected as e:
+        #Server dropped us between the liveness probe and the send, retry once on a fresh connection.
+        smtp.reconnect()
+        smtp.send(content_type=mime_type)
+    finally:
+      smtp_pool.release(smtp)
 
   except Exception as e:
     raise e
+
+
+def email_results_batch(email_settings: {}, messages: [], mime_type='plain'):
+  '''
+  Sends a batch of emails over a single pooled connection.
+  :param email_settings:
+  :param messages: List of (subject, message) tuples.
+  :param mime_type:
+  :return: List of (index, exception) tuples for the messages that failed.
+  '''
+  smtp = smtp_pool.acquire(email_settings)
+  try:
+    batch = []
+    for subject, message in messages:
+      smtp.reset()
+      smtp.rcpt_to(email_settings['to_addresses'])
+      smtp.from_addr(email_settings['from_address'])
+      smtp.subject(subject)
+      smtp.message(message)
+      batch.append((email_settings['from_address'],
+                    email_settings['to_addresses'],
+                    smtp.build_message(content_type=mime_type).as_bytes(policy=policy.SMTP)))
+    start_cnt = smtp.messages_sent
+    failed = []
+    try:
+      smtp.send_batch(batch, failed)
+    except smtplib.SMTPServerDisconnected as e:
+      #Resend whatever hadn't gone out yet on a fresh connection.
+      done_cnt = smtp.messages_sent - start_cnt + len(failed)
+      smtp.reconnect()
+      for ndx, err in smtp.send_batch(batch[done_cnt:]):
+        failed.append((ndx + done_cnt, err))
+  finally:
+    smtp_pool.release(smtp)
+  return failed
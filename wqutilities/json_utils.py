@@ -0,0 +1,41 @@
+"""
+JSON helpers that use orjson when it's installed and fall back to the standard library json module.
+Both paths produce the same layout, compact or 2 space indented, UTF-8 encoded bytes.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(data):
+    """
+    Parse JSON from a str or bytes object.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj, indent: bool = False, sort_keys: bool = False) -> bytes:
+    """
+    Serialize obj to UTF-8 encoded JSON bytes. Non str dict keys and numpy values are accepted
+    like the json module accepts them, anything orjson still refuses goes through the json module.
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, option=option)
+        except TypeError:
+            pass
+    if indent:
+        return json.dumps(obj, indent=2, sort_keys=sort_keys, ensure_ascii=False,
+                          separators=(',', ': ')).encode('utf-8')
+    return json.dumps(obj, sort_keys=sort_keys, ensure_ascii=False,
+                      separators=(',', ':')).encode('utf-8')
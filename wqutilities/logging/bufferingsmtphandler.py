@@ -23,13 +23,47 @@
 of SMTPHandler.
 Copyright (C) 2001-2002 Vinay Sajip. All Rights Reserved.
 """
+import atexit
+import collections
 import logging
-from wqutilities import logging
+import logging.handlers
+import queue
+import smtplib
+import threading
 import traceback
+import weakref
+
+#Largest message buffer kept around for reuse between flushes, bigger ones are released.
+MAX_RETAINED_BUFFER = 64 * 1024
+
+#Handlers that haven't been closed yet. Weak so the exit hook doesn't keep them alive.
+_open_handlers = weakref.WeakSet()
+
+
+def _shutdown_handlers():
+    for handler in list(_open_handlers):
+        handler._shutdown()
+
+
+atexit.register(_shutdown_handlers)
+
+
+def _send_worker(pending, handler_ref):
+    #Only holds the handler weakly between sends so an unclosed handler can still be collected.
+    while True:
+        records = pending.get()
+        if records is None:
+            break
+        handler = handler_ref()
+        if handler is None:
+            break
+        handler._send_records(records)
+        del handler
 
 
 class BufferingSMTPHandler(logging.handlers.BufferingHandler):
-    def __init__(self, mailhost, fromaddr, toaddrs, subject, user_and_password, capacity, port=25, use_tls=False):
+    def __init__(self, mailhost, fromaddr, toaddrs, subject, user_and_password, capacity, port=25, use_tls=False,
+                 flush_level=logging.ERROR, echo=False, byte_capacity=1024 * 1024):
         logging.handlers.BufferingHandler.__init__(self, capacity)
         #logging.Handler.__init__(self)
 
@@ -42,44 +76,146 @@ class BufferingSMTPHandler(logging.handlers.BufferingHandler):
         self.user = user_and_password[0]
         self.password = user_and_password[1]
         self.setFormatter(logging.Formatter("%(asctime)s %(levelname)-5s %(message)s"))
+        self.flush_level = flush_level
+        self.echo = echo  # Print each record to stdout as it's mailed.
+        #Record count alone doesn't bound memory when records carry long tracebacks, so also
+        #flush once the formatted records reach byte_capacity, counted as UTF-8 bytes.
+        self.byte_capacity = byte_capacity
+        self._bytes_buffered = 0
+        self.buffer = collections.deque(maxlen=capacity)
+        self._smtp = None
+        self._smtp_lock = threading.Lock()
+        self._msg_buf = bytearray()
+        #Full buffers are handed to a worker thread so logging calls never block on the mail server.
+        self._closed = False
+        self._pending = queue.Queue()
+        self._worker = threading.Thread(target=_send_worker, args=(self._pending, weakref.ref(self)),
+                                        name="BufferingSMTPHandler", daemon=True)
+        self._worker.start()
+        #Stop the worker if the handler is collected without being closed.
+        weakref.finalize(self, self._pending.put, None)
+        _open_handlers.add(self)
 
     def emit(self, record):
         """
         Emit a record.
 
-        Append the record. If shouldFlush() tells us to, call flush() to process
-        the buffer.
+        Format and append the record. If shouldFlush() tells us to, hand the buffer off to the
+        worker thread to be mailed, or once the handler is closed, mail it here.
         """
         if record.levelno >= self.level:
-            self.buffer.append(record)
+            #Buffer the formatted line, not the record, so the worker has nothing left to format.
+            msg = self.format(record)
+            #Characters and bytes only match for ASCII, anything else is measured encoded.
+            self._bytes_buffered += (len(msg) if msg.isascii() else len(msg.encode('utf-8'))) + 2
+            self.buffer.append(msg)
             if self.shouldFlush(record):
-                self.flush()
+                if self._closed:
+                    #The worker is gone, anything queued now would never be sent.
+                    self.flush()
+                else:
+                    self._pending.put(self.buffer)
+                    self.buffer = collections.deque(maxlen=self.capacity)
+                    self._bytes_buffered = 0
 
-    def flush(self):
-        if len(self.buffer) > 0:
+    def shouldFlush(self, record):
+        return (len(self.buffer) >= self.capacity or
+                self._bytes_buffered >= self.byte_capacity or
+                record.levelno >= self.flush_level)
+
+    def _shutdown(self):
+        #Let the worker drain what's already queued, then send the remainder synchronously.
+        _open_handlers.discard(self)
+        if not self._closed:
+            self._closed = True
+            self._pending.put(None)
+            self._worker.join(timeout=30)
+        self.flush()
+        with self._smtp_lock:
+            self._quit_smtp()
+
+    def close(self):
+        """
+        Mail anything still buffered, stop the worker and quit the SMTP session. Records emitted
+        after this are mailed synchronously.
+        """
+        self._shutdown()
+        logging.handlers.BufferingHandler.close(self)
+
+    def _connect(self):
+        port = self.mailport
+        if not port:
+            port = smtplib.SMTP_PORT
+        if not self.use_tls:
+            smtp = smtplib.SMTP(self.mailhost, port)
+        else:
+            smtp = smtplib.SMTP_SSL(self.mailhost, port)
+            smtp.ehlo()
+
+        smtp.login(self.user, self.password)
+        self._smtp = smtp
+        return smtp
+
+    def _get_smtp(self):
+        """
+        Return the SMTP session kept between flushes. The first send connects, after that
+        a NOOP keeps the session alive and we only reconnect if the server dropped us.
+        Caller must hold _smtp_lock.
+        """
+        if self._smtp is None:
+            return self._connect()
+        try:
+            status, msg = self._smtp.noop()
+            if status == 250:
+                return self._smtp
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._smtp = None
+        return self._connect()
+
+    def _quit_smtp(self):
+        if self._smtp is not None:
             try:
-                import smtplib
-                port = self.mailport
-                if not port:
-                    port = smtplib.SMTP_PORT
-                if not self.use_tls:
-                    smtp = smtplib.SMTP(self.mailhost, port)
-                else:
-                    smtp = smtplib.SMTP_SSL(self.mailhost, port)
-                    smtp.ehlo()
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
 
-                smtp.login(self.user, self.password)
+    def flush(self):
+        """
+        Synchronously mail whatever is buffered, used on close and at interpreter shutdown.
+        """
+        self.acquire()
+        try:
+            records = self.buffer
+            self.buffer = collections.deque(maxlen=self.capacity)
+            self._bytes_buffered = 0
+        finally:
+            self.release()
+        if len(records) > 0:
+            self._send_records(records)
+
+    def _send_records(self, records):
+        with self._smtp_lock:
+            try:
+                smtp = self._get_smtp()
                 #msg = "From: %s\r\nTo: %s\r\nSubject: %s\r\n\r\n" % (self.fromaddr, string.join(self.toaddrs, ","), self.subject)
-                msg = "From: %s\r\nTo: %s\r\nSubject: %s\r\n\r\n" % (self.fromaddr, ",".join(self.toaddrs), self.subject)
-                for record in self.buffer:
-                    s = self.format(record)
-                    print(s)
-                    msg = msg + s + "\r\n"
-
-                smtp.sendmail(self.fromaddr, self.toaddrs, msg)
-                smtp.quit()
+                #Reuse the buffer from the last send, only touched while holding _smtp_lock.
+                buf = self._msg_buf
+                del buf[:]
+                buf.extend(("From: %s\r\nTo: %s\r\nSubject: %s\r\n\r\n" % (self.fromaddr, ",".join(self.toaddrs), self.subject)).encode("utf-8"))
+                for s in records:
+                    if self.echo:
+                        print(s)
+                    buf.extend(s.encode("utf-8"))
+                    buf.extend(b"\r\n")
+
+                smtp.sendmail(self.fromaddr, self.toaddrs, bytes(buf))
             except Exception as e:
                 traceback.print_exc()
+                #Don't reuse a session that may be in a bad state.
+                self._quit_smtp()
                 #self.handleError(None)  # no particular record
-            self.buffer = []
-
+            finally:
+                if len(self._msg_buf) > MAX_RETAINED_BUFFER:
+                    self._msg_buf = bytearray()
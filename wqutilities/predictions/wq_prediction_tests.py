@@ -8,19 +8,19 @@ class predictionLevels(object):
   LOW = 1
   MEDIUM = 2
   HIGH = 3
+  #Labels for the values that only match exactly, anything else outside LOW to HIGH is NO TEST.
+  _LABELS = {
+    DISABLED: "TEST DISABLED",
+    HIGH: "HIGH"
+  }
   def __init__(self, value):
     self.__value = value
   def __str__(self):
-    if self.value >= self.LOW and self.value < self.HIGH:
+    value = self.__value
+    #Everything from LOW up to, not including, HIGH is LOW, MEDIUM and fractional levels included.
+    if self.LOW <= value < self.HIGH:
       return "LOW"
-#    elif self.value == self.MEDIUM:
-#      return "MEDIUM"
-    elif self.value == self.HIGH:
-      return "HIGH"
-    elif self.value == self.DISABLED:
-      return "TEST DISABLED"
-    else:
-      return "NO TEST"
+    return predictionLevels._LABELS.get(value, "NO TEST")
 
   @property
   def value(self):
@@ -210,24 +210,18 @@ class wqEquations(object):
     A predictionLevels value.
   """
   def overallPrediction(self):
-    allTestsComplete = True
-    executedTstCnt = 0
-    if len(self._tests):
-      sum = 0
-      for testObj in self._tests:
-        #DWR 2011-10-11
-        #If a test wasn't executed, we skip using it.
-        if testObj.predictionLevel.value != predictionLevels.NO_TEST and\
-          testObj.predictionLevel.value != predictionLevels.DISABLED:
-          sum += testObj.predictionLevel.value
-          executedTstCnt += 1
-
-      if executedTstCnt:
-        self._ensemblePrediction.value = int(round(sum / float(executedTstCnt)))
-
-
-    if self.logger is not None:
-      self.logger.debug("Overall Prediction: %d(%s)" %(self._ensemblePrediction.value, str(self._ensemblePrediction)))
+    #DWR 2011-10-11
+    #If a test wasn't executed, we skip using it.
+    no_test = predictionLevels.NO_TEST
+    disabled = predictionLevels.DISABLED
+    executed_levels = [level for level in (testObj.predictionLevel.value for testObj in self._tests)
+                       if level != no_test and level != disabled]
+    if executed_levels:
+      self._ensemblePrediction.value = int(round(sum(executed_levels) / float(len(executed_levels))))
+
+
+    if self.logger is not None and self.logger.isEnabledFor(logging.DEBUG):
+      self.logger.debug("Overall Prediction: %d(%s)", self._ensemblePrediction.value, self._ensemblePrediction)
     return self._ensemblePrediction
 
 
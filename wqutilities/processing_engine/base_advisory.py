@@ -35,6 +35,26 @@ class Advisory(BaseDataItem):
         self.status = AdvisoryStatus.ACTIVE
         self.affected_areas = affected_areas or []
 
+    # severity and status keep their enum .value strings alongside so to_dict() doesn't
+    # resolve them on every call.
+    @property
+    def severity(self) -> AdvisorySeverity:
+        return self._severity
+
+    @severity.setter
+    def severity(self, severity: AdvisorySeverity):
+        self._severity = severity
+        self._severity_str = severity.value
+
+    @property
+    def status(self) -> AdvisoryStatus:
+        return self._status
+
+    @status.setter
+    def status(self, status: AdvisoryStatus):
+        self._status = status
+        self._status_str = status.value
+
     def validate(self) -> bool:
         """Validate advisory data."""
         return (self.title and self.description and
@@ -42,25 +62,34 @@ class Advisory(BaseDataItem):
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert advisory to dictionary."""
-        base_dict = {
+        return {
             'item_id': self.item_id,
             'item_type': self.item_type,
             'source': self.source,
             'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'metadata': self.metadata,
-            'tags': self.tags
-        }
-
-        advisory_dict = {
+            'tags': self.tags,
             'title': self.title,
             'description': self.description,
-            'severity': self.severity.value,
-            'status': self.status.value,
+            'severity': self._severity_str,
+            'status': self._status_str,
             'affected_areas': self.affected_areas
         }
 
-        return {**base_dict, **advisory_dict}
+    # Fields update_from() copies, created_at stays as when the advisory was first seen.
+    _UPDATE_FIELDS = ('source', 'title', 'description', 'severity', 'status',
+                      'affected_areas', 'metadata', 'tags', 'updated_at')
+
+    def update_from(self, other: 'Advisory') -> None:
+        """
+        Copy other's fields onto this advisory so one instance can be kept per advisory id
+        across collection cycles. Only fields that changed are assigned.
+        """
+        for name in self._UPDATE_FIELDS:
+            value = getattr(other, name)
+            if getattr(self, name) != value:
+                setattr(self, name, value)
 
     def is_critical(self) -> bool:
         """Check if advisory is critical severity."""
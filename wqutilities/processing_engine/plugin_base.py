@@ -3,10 +3,11 @@ from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any, List, Generic, TypeVar
 from enum import Enum
-import json
 import logging
 from dataclasses import dataclass
 
+from .. import json_utils
+
 # Generic type variable for data items
 T = TypeVar('T')
 
@@ -18,7 +19,7 @@ class PluginStatus(Enum):
     ERROR = "error"
 
 
-@dataclass
+@dataclass(slots=True)
 class PluginConfig:
     """Configuration data for plugins."""
     name: str = ""
@@ -33,6 +34,21 @@ class PluginConfig:
         if self.config is None:
             self.config = {}
 
+    @classmethod
+    def from_dict(cls, name: str, data: Dict[str, Any]) -> 'PluginConfig':
+        """
+        Build a PluginConfig from a parsed config file. name is the config file stem, module
+        defaults to it.
+        """
+        if type(data) is not dict:
+            raise ValueError(f"Plugin config {name} is not an object")
+        return cls(name=name,
+                   module=data.get('module', name),
+                   enabled=data.get('enabled', True),
+                   config=data.get('config', {}),
+                   retry_count=data.get('retry_count', 3),
+                   timeout=data.get('timeout', 30))
+
 @dataclass
 class BaseDataItem(ABC):
     """Base class for all data items that can be processed by the engine."""
@@ -95,7 +111,7 @@ class BaseDataItem(ABC):
 
     def to_json(self) -> str:
         """Convert data item to JSON string."""
-        return json.dumps(self.to_dict(), indent=2)
+        return json_utils.dumps(self.to_dict(), indent=True).decode('utf-8')
 
 
 class BaseCollectorPlugin(ABC, Generic[T]):
@@ -105,9 +121,30 @@ class BaseCollectorPlugin(ABC, Generic[T]):
         self.plugin_config = config
         self.status = PluginStatus.ENABLED if config.enabled else PluginStatus.DISABLED
         self.logger = logging.getLogger(f"collector.{config.name}")
-        self.last_run = None
+        # Wall clock time of the last collect in ns, the engine stamps it with time.time_ns()
+        # and the datetime/ISO string are only built when something asks for them.
+        self.last_run_ns = None
+        self._last_run_iso = (None, None)
         self.error_count = 0
 
+    @property
+    def last_run(self):
+        if self.last_run_ns is None:
+            return None
+        return datetime.fromtimestamp(self.last_run_ns / 1e9)
+
+    @last_run.setter
+    def last_run(self, value: datetime):
+        self.last_run_ns = None if value is None else int(value.timestamp() * 1e9)
+
+    def last_run_isoformat(self):
+        """ISO formatted last_run, formatted once per run."""
+        last_run_ns, iso_str = self._last_run_iso
+        if last_run_ns != self.last_run_ns:
+            iso_str = self.last_run.isoformat() if self.last_run_ns is not None else None
+            self._last_run_iso = (self.last_run_ns, iso_str)
+        return iso_str
+
     @abstractmethod
     def collect_data(self) -> List[T]:
         """Collect data items from the data source."""
@@ -134,12 +171,12 @@ class BaseCollectorPlugin(ABC, Generic[T]):
     def set_status(self, status: PluginStatus):
         """Set plugin status."""
         self.status = status
-        self.logger.info(f"Plugin status changed to: {status.value}")
+        self.logger.info("Plugin status changed to: %s", status.value)
 
     def handle_error(self, error: Exception):
         """Handle plugin errors."""
         self.error_count += 1
-        self.logger.error(f"Plugin error (count: {self.error_count}): {str(error)}")
+        self.logger.error("Plugin error (count: %d): %s", self.error_count, error)
         if self.error_count >= self.plugin_config.retry_count:
             self.set_status(PluginStatus.ERROR)
 
@@ -153,6 +190,7 @@ class BaseOutputPlugin(ABC, Generic[T]):
         self.logger = logging.getLogger(f"output.{config.name}")
         self.sent_count = 0
         self.error_count = 0
+        self._supported_types = None
 
     @abstractmethod
     def get_plugin_name(self) -> str:
@@ -164,6 +202,20 @@ class BaseOutputPlugin(ABC, Generic[T]):
         """Send data item to the output destination."""
         pass
 
+    def send_batch(self, data_items: List[T]) -> int:
+        """
+        Send a list of data items, returns how many were sent. The default sends them one at a
+        time through send_data, override it to send the whole list in one go.
+        """
+        sent = 0
+        for data_item in data_items:
+            try:
+                if self.send_data(data_item):
+                    sent += 1
+            except Exception as e:
+                self.handle_error(e)
+        return sent
+
     @abstractmethod
     def validate_config(self) -> bool:
         """Validate plugin configuration."""
@@ -183,19 +235,26 @@ class BaseOutputPlugin(ABC, Generic[T]):
         """Check if plugin is enabled."""
         return self.status == PluginStatus.ENABLED
 
+    @property
+    def supported_types(self) -> frozenset:
+        """Supported data types as a frozenset, built from get_supported_data_types() on first use."""
+        if self._supported_types is None:
+            self._supported_types = frozenset(self.get_supported_data_types())
+        return self._supported_types
+
     def should_send(self, data_item: T) -> bool:
         """Determine if data item should be sent via this plugin."""
         # Override in subclasses for filtering logic
-        return data_item.item_type in self.get_supported_data_types()
+        return data_item.item_type in self.supported_types
 
     def set_status(self, status: PluginStatus):
         """Set plugin status."""
         self.status = status
-        self.logger.info(f"Plugin status changed to: {status.value}")
+        self.logger.info("Plugin status changed to: %s", status.value)
 
     def handle_error(self, error: Exception):
         """Handle plugin errors."""
         self.error_count += 1
-        self.logger.error(f"Plugin error (count: {self.error_count}): {str(error)}")
+        self.logger.error("Plugin error (count: %d): %s", self.error_count, error)
         if self.error_count >= self.plugin_config.retry_count:
             self.set_status(PluginStatus.ERROR)
@@ -1,265 +1,523 @@
-from typing import Dict, List, Type
-import json
+from typing import Dict, List, Mapping, Type
+from types import MappingProxyType
 import logging
-import importlib.util
 from pathlib import Path
-import configparser
 
 from .plugin_base import PluginConfig
-
-import importlib.util
+from .. import json_utils
 
 import os
+import re
+import sys
+import hashlib
+import tempfile
+import ast
+import builtins
 import importlib.util
-import inspect
+import importlib.machinery
+import dataclasses
+from concurrent.futures import ThreadPoolExecutor
 
-class PluginLoader:
-    def __init__(self, plugin_dir: str,
-                 config_dirs: str,
-                 base_class: Type):
-        self.plugin_dir = plugin_dir
-        self.config_dirs = plugin_dir
-        if len(config_dirs):
-            self.config_dirs.extend(config_dirs)
-        self.base_class = base_class
-        self.plugins = []
-        self.configs = {}
+logger = logging.getLogger(__name__)
 
-    def load_plugin_configs(self):
-        """
-        Load plugin configurations from JSON files in multiple directories.
 
-        Args:
-            config_dirs: List of directories containing JSON configuration files
+#Plugin and config file names, dunder files are skipped.
+_FILE_RE = re.compile(r'^(?!__)(.+)\.(py|json|ini)$')
 
-        Returns:
-            Dictionary of plugin name to PluginConfig
-        """
-        configs = {}
 
-        config_path = Path(self.config_dirs)
-
-        if not config_path.exists():
-            logging.warning(f"Config directory does not exist: {config_path}")
-        else:
-            for config_file in config_path.glob("*.json"):
-                try:
-                    with open(config_file, 'r') as f:
-                        config_data = json.load(f)
-
-                    module_name = config_data.get('module', config_file.stem)
-                    #plugin_name = config_data.get('name')
-                    self.configs[module_name] = PluginConfig(
-                        name=config_file.stem,
-                        module=module_name,
-                        enabled=config_data.get('enabled', True),
-                        config=config_data.get('config', {}),
-                        retry_count=config_data.get('retry_count', 3),
-                        timeout=config_data.get('timeout', 30)
-                    )
-                    logging.info(f"Loaded config for plugin: {module_name} from {config_path}")
-
-                except Exception as e:
-                    logging.error(f"Failed to load config from {config_file}: {str(e)}")
-
-            for config_file in config_path.glob("*.ini"):
-                try:
-                    config_file = configparser.SafeConfigParser(
-                        defaults={
-                            'enabled': True,
-                            'config': {},
-                            'retry_count': 3,
-                            'timeout': 30
-                        }
-                    )
-                    config_file.read(config_file)
-
-                    plugin_name = config_file.stem
-                    #plugin_name = config_file.get('name')
-                    self._configs[plugin_name] = PluginConfig(
-                        name=plugin_name,
-                        enabled=config_file.get('default', 'enabled'),
-                        config=config_file.get('default', 'config'),
-                        retry_count=config_file.get('default', 'retry_count'),
-                        timeout=config_file.get('default', 'timeout')
-                    )
-                    logging.info(f"Loaded config for plugin: {plugin_name} from {config_path}")
+def _scan_directory(directory: str):
+    """
+    Single os.scandir pass over directory, sorting its files into python, json and ini
+    lists of (stem, DirEntry) tuples. Dunder files are skipped.
+    """
+    files = {'py': [], 'json': [], 'ini': []}
+    with os.scandir(directory) as dir_entries:
+        for entry in dir_entries:
+            match = _FILE_RE.match(entry.name)
+            if match is not None and entry.is_file():
+                stem, ext = match.groups()
+                files[ext].append((stem, entry))
+    return files['py'], files['json'], files['ini']
 
-                except Exception as e:
-                    logging.error(f"Failed to load config from {config_file}: {str(e)}")
 
-        return self.configs
+#Files up to this size are read with a single os.read, skipping the buffered file object.
+SMALL_FILE_SIZE = 4096
 
-    def discover_plugins(self) -> List[Type[PluginConfig]]:
-        for filename in os.listdir(self.plugin_dir):
-            if filename.endswith(".py") and not filename.startswith("__"):
-                module_path = os.path.join(self.plugin_dir, filename)
-                module_name = os.path.splitext(filename)[0]
-                plugin = self._load_plugin(module_name, module_path)
-                if plugin:
-                    self.plugins.extend(plugin)
 
-        return self.plugins
-
-    def _load_plugin(self, module_name, module_path):
-        spec = importlib.util.spec_from_file_location(module_name, module_path)
-        if spec and spec.loader:
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
-            return self._find_plugins_in_module(module)
-        return []
+def _read_file(entry) -> bytes:
+    """
+    Read the file for a DirEntry as bytes.
+    """
+    if entry.stat().st_size <= SMALL_FILE_SIZE:
+        fd = os.open(entry.path, os.O_RDONLY)
+        try:
+            chunks = []
+            while True:
+                chunk = os.read(fd, SMALL_FILE_SIZE + 1)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            return b"".join(chunks)
+        finally:
+            os.close(fd)
+    with open(entry.path, 'rb') as f:
+        return f.read()
+
+
+def _read_file_or_error(entry):
+    try:
+        return _read_file(entry)
+    except OSError as e:
+        return e
+
+
+def _bulk_read_bytes(entries) -> List[bytes]:
+    """
+    Read the files for a list of DirEntry objects, overlapping the reads on a thread pool
+    when there's more than one. A file that can't be read gets its OSError in place of
+    the bytes.
+    """
+    if len(entries) < 2:
+        return [_read_file_or_error(entry) for entry in entries]
+    with ThreadPoolExecutor(max_workers=min(8, len(entries))) as pool:
+        return list(pool.map(_read_file_or_error, entries))
 
-    def _find_plugins_in_module(self, module):
-        found_plugins = []
-        for name, obj in inspect.getmembers(module, inspect.isclass):
-            if self.base_class and issubclass(obj, self.base_class) and obj is not self.base_class:
-                found_plugins.append(obj)
-        return found_plugins
 
+class _DiscoveryCache:
+    """
+    On disk index of the plugin classes each file in a plugin directory defines. Entries are
+    keyed on the file's (mtime_ns, size) so unchanged files don't have to be scanned again, and
+    files known to define no plugins don't have to be imported at all. The index lives in the
+    user's cache directory, $XDG_CACHE_HOME or ~/.cache, not in the plugin directory, which may
+    be read only.
+    """
+    __slots__ = ('cache_file', '_base_key', '_index', '_entries', '_seen', '_dirty')
+    #Bumped when what _scan_class_names returns changes, an index from an older version is dropped.
+    VERSION = 2
+
+    @staticmethod
+    def cache_directory() -> str:
+        cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(cache_home, 'wqutilities', 'plugin_cache')
+
+    def __init__(self, plugin_dir: str, base_class: Type):
+        # One index file per plugin directory, named from a hash of its absolute path.
+        dir_key = hashlib.sha1(os.path.abspath(plugin_dir).encode('utf-8')).hexdigest()
+        self.cache_file = os.path.join(self.cache_directory(), f"{dir_key}.json")
+        self._base_key = f"{base_class.__module__}.{base_class.__qualname__}" if base_class else ""
+        try:
+            with open(self.cache_file, 'rb') as f:
+                self._index = json_utils.loads(f.read())
+        except (OSError, ValueError):
+            self._index = {}
+        if self._index.get('version') != self.VERSION:
+            self._index = {'version': self.VERSION}
+        self._entries = self._index.get(self._base_key, {})
+        self._seen = {}
+        self._dirty = False
+
+    def get(self, module_path: str, file_stat) -> List[str]:
+        """Return the cached class names for the file, or None if it needs to be scanned."""
+        entry = self._entries.get(module_path)
+        if entry is not None and entry['mtime_ns'] == file_stat.st_mtime_ns and entry['size'] == file_stat.st_size:
+            self._seen[module_path] = entry
+            return entry['classes']
+        return None
+
+    def put(self, module_path: str, file_stat, class_names: List[str]):
+        self._seen[module_path] = {
+            'mtime_ns': file_stat.st_mtime_ns,
+            'size': file_stat.st_size,
+            'classes': class_names
+        }
+        self._dirty = True
+
+    def save(self):
+        # Only keep entries for files that still exist.
+        if not self._dirty and len(self._seen) == len(self._entries):
+            return
+        self._index[self._base_key] = self._seen
+        tmp_file = None
+        try:
+            cache_dir = os.path.dirname(self.cache_file)
+            os.makedirs(cache_dir, exist_ok=True)
+            # Uniquely named so two processes saving the same index can't write into one temp file.
+            with tempfile.NamedTemporaryFile('wb', dir=cache_dir, suffix='.tmp', delete=False) as f:
+                tmp_file = f.name
+                f.write(json_utils.dumps(self._index))
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            logger.debug(f"Unable to write plugin cache {self.cache_file}: {str(e)}")
+            if tmp_file is not None:
+                try:
+                    os.remove(tmp_file)
+                except OSError:
+                    pass
 
-    def get_plugins(self):
-        return self.plugins
 
-'''
-class PluginLoader:
-  """Utility class for loading plugins from directories."""
+#_scan_class_names result for a file the source scan can't vouch for, it's imported at discovery
+#and every plugin class it defines is taken.
+_IMPORT_MODULE = "*"
 
-  @staticmethod
-  def load_plugins_from_directory(plugin_dir: str, base_class: Type) -> Dict[str, Type]:
-    """
-    Load all plugins from a directory that inherit from the specified base class.
 
-    Args:
-        plugin_dir: Directory path containing plugin files
-        base_class: Base class that plugins should inherit from
+#INI keys that map to PluginConfig fields, the rest of a section is the plugin's own config.
+_INI_RESERVED_KEYS = frozenset(('module', 'enabled', 'retry_count', 'timeout'))
 
-    Returns:
-        Dictionary of plugin name to plugin class
-    """
-    plugins = {}
-    plugin_path = Path(plugin_dir)
-
-    if not plugin_path.exists():
-      logging.warning(f"Plugin directory does not exist: {plugin_dir}")
-      return plugins
-
-    # Add plugin directory to Python path
-    if str(plugin_path.absolute()) not in sys.path:
-      sys.path.insert(0, str(plugin_path.absolute()))
-
-    # Load all Python files in the directory
-    for plugin_file in plugin_path.glob("*.py"):
-      if plugin_file.name.startswith("__"):
-        continue
-
-      try:
-        # Import the module
-        spec = importlib.util.spec_from_file_location(
-          plugin_file.stem, plugin_file
-        )
-        module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(module)
 
-        # Find all classes that inherit from base_class
-        for name, obj in inspect.getmembers(module):
-          if (inspect.isclass(obj) and
-                  issubclass(obj, base_class) and
-                  obj != base_class):
-            plugins[name] = obj
-            logging.info(f"Loaded plugin: {name} from {plugin_file.name}")
+#Shared by every PluginLoader in the process, so engines built one after another, or a
+#reload, don't repeat work for files that haven't changed.
+#(plugin_dir, base_class) -> (signature of the plugin files, discovered plugins, resolved classes or None)
+_discovered_plugins = {}
+#Config file path -> (mtime_ns, size, (module_name, PluginConfig))
+_parsed_configs = {}
 
-      except Exception as e:
-        logging.error(f"Failed to load plugin from {plugin_file}: {str(e)}")
-        logging.exception(e)
 
-    return plugins
+class PluginLoader:
+    __slots__ = ('plugin_dir', 'config_dirs', 'base_class', 'plugins', 'configs',
+                 '_plugin_classes', '_plugins_by_name', '_finder', '_is_plugin')
 
-  @staticmethod
-  def load_plugin_configs(config_dirs: List[str]) -> Dict[str, PluginConfig]:
-    """
-    Load plugin configurations from JSON files in multiple directories.
+    def __init__(self, plugin_dir: str,
+                 config_dirs: List[str],
+                 base_class: Type):
+        # Resolved once, the per file paths and the discovery cache keys all hang off of it.
+        self.plugin_dir = os.fspath(Path(plugin_dir).resolve())
+        # Plugin groups often share a config directory, only scan each one once. Built once
+        # as a tuple so the caller's list is never touched and it can't change under a
+        # load_plugin_configs() call.
+        self.config_dirs: tuple = tuple(dict.fromkeys(
+            [self.plugin_dir, *(os.fspath(Path(config_dir).resolve()) for config_dir in config_dirs or ())]))
+        self.base_class = base_class
+        self.plugins = ()
+        self._plugin_classes = None
+        self._plugins_by_name = None
+        self.configs = {}
+        # Finder scoped to plugin_dir, specs are found without going through sys.path, and
+        # it keeps its own listing of the directory between lookups.
+        self._finder = importlib.machinery.FileFinder(
+            self.plugin_dir, (importlib.machinery.SourceFileLoader, importlib.machinery.SOURCE_SUFFIXES))
+        # Class -> issubclass(class, base_class), saves repeating the check across get_plugins() calls.
+        self._is_plugin = {}
 
-    Args:
-        config_dirs: List of directories containing JSON configuration files
+    def load_plugin_configs(self):
+        """
+        Load plugin configurations from the JSON and INI files in config_dirs. Parsed configs
+        are kept per file, so calling this again only re-parses files that changed.
 
-    Returns:
-        Dictionary of plugin name to PluginConfig
-    """
-    configs = {}
+        Returns:
+            Dictionary of plugin name to PluginConfig
+        """
+        configs = []
+        pending = []
+        for config_path in self.config_dirs:
+            try:
+                py_files, json_files, ini_files = _scan_directory(config_path)
+            except FileNotFoundError:
+                logger.warning(f"Config directory does not exist: {config_path}")
+                continue
+            # One config per stem, a JSON file wins over an INI file with the same name so
+            # the INI is never parsed.
+            by_stem = {}
+            for config_stem, config_file in ini_files:
+                by_stem[config_stem] = (config_file, self._parse_ini_config)
+            for config_stem, config_file in json_files:
+                by_stem[config_stem] = (config_file, self._parse_json_config)
+            for config_stem, (config_file, parse) in by_stem.items():
+                self._cached_config(configs, pending, config_stem, config_file, parse, config_path)
+
+        if pending:
+            # Read all the new or changed files at once, then parse them.
+            contents = _bulk_read_bytes([load_args[2] for ndx, load_args in pending])
+            for (ndx, load_args), data in zip(pending, contents):
+                configs[ndx] = self._load_config(*load_args, data)
+        self.configs.update(config for config in configs if config is not None)
 
-    for config_dir in config_dirs:
-      config_path = Path(config_dir)
+        return self.configs
 
-      if not config_path.exists():
-        logging.warning(f"Config directory does not exist: {config_dir}")
-        continue
+    def _cached_config(self, configs, pending, config_stem, config_file, parse, config_path):
+        """
+        Append the cached config for the file, or a placeholder and the file to pending
+        if it's new or changed.
+        """
+        file_stat = config_file.stat()
+        cached = _parsed_configs.get(config_file.path)
+        if cached is not None and cached[0] == file_stat.st_mtime_ns and cached[1] == file_stat.st_size:
+            module_name, plugin_config = cached[2]
+            # The engine sets base_directory on the config it gets, so hand out a copy.
+            configs.append((module_name, dataclasses.replace(plugin_config, config=dict(plugin_config.config))))
+        else:
+            pending.append((len(configs), (file_stat, config_stem, config_file, parse, config_path)))
+            configs.append(None)
 
-      for config_file in config_path.glob("*.json"):
+    def _load_config(self, file_stat, config_stem, config_file, parse, config_path, data):
         try:
-          with open(config_file, 'r') as f:
-            config_data = json.load(f)
-
-          plugin_name = config_file.stem
-          configs[plugin_name] = PluginConfig(
-            name=plugin_name,
-            enabled=config_data.get('enabled', True),
-            config=config_data.get('config', {}),
-            retry_count=config_data.get('retry_count', 3),
-            timeout=config_data.get('timeout', 30)
-          )
-          logging.info(f"Loaded config for plugin: {plugin_name} from {config_dir}")
-
+            if isinstance(data, Exception):
+                raise data
+            module_name, plugin_config = parse(config_stem, config_file, data)
         except Exception as e:
-          logging.error(f"Failed to load config from {config_file}: {str(e)}")
+            logger.error(f"Failed to load config from {config_file.path}: {str(e)}")
+            return None
+        _parsed_configs[config_file.path] = (file_stat.st_mtime_ns, file_stat.st_size,
+                                             (module_name, dataclasses.replace(plugin_config, config=dict(plugin_config.config))))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Loaded config for plugin: {module_name} from {config_path}")
+        return module_name, plugin_config
+
+    def _parse_json_config(self, config_stem, config_file, data):
+        # Cheap check before handing it to the parser, a config has to be a JSON object.
+        if data.lstrip()[:1] != b'{':
+            raise ValueError("not a JSON object")
+        config_data = json_utils.loads(data)
+        #plugin_name = config_data.get('name')
+        plugin_config = PluginConfig.from_dict(config_stem, config_data)
+        return plugin_config.module, plugin_config
+
+    def _parse_ini_config(self, config_stem, config_file, data):
+        # Only needed when there are INI configs, don't pay for the import otherwise.
+        import configparser
+        parser = configparser.ConfigParser()
+        parser.read_string(data.decode('utf-8'), source=config_file.path)
+
+        # Settings can go in [DEFAULT] or a single section of their own, DEFAULT
+        # values show up in every section so the first section covers both. Any other
+        # key in the section, or in a [config] section, is plugin specific and goes
+        # into config as a string.
+        sections = parser.sections()
+        section = parser[sections[0]] if sections else parser['DEFAULT']
+        module_name = section.get('module', config_stem)
+        plugin_settings = {key: value for key, value in section.items() if key not in _INI_RESERVED_KEYS}
+        if parser.has_section('config'):
+            plugin_settings.update((key, value) for key, value in parser['config'].items()
+                                   if key not in _INI_RESERVED_KEYS)
+        return module_name, PluginConfig(
+            name=config_stem,
+            module=module_name,
+            enabled=section.getboolean('enabled', True),
+            config=plugin_settings,
+            retry_count=section.getint('retry_count', 3),
+            timeout=section.getint('timeout', 30)
+        )
 
-      for config_file in config_path.glob("*.ini"):
+    def discover_plugins(self) -> List[str]:
+        """
+        Find the plugin classes in plugin_dir. Class names come from parsing the source, and
+        the modules are loaded through LazyLoader, so no plugin code runs here, only when
+        get_plugins() first touches the class. A module the source scan can't read the classes
+        from is imported here instead. Returns the plugin class names.
+        """
+        py_files, json_files, ini_files = _scan_directory(self.plugin_dir)
+        py_entries = [entry for module_name, entry in py_files]
+        # DirEntry caches the stat result.
+        file_stats = [entry.stat() for entry in py_entries]
+        # If no plugin file changed since the last loader looked at this directory, reuse
+        # its modules rather than loading them again.
+        signature = tuple((entry.path, file_stat.st_mtime_ns, file_stat.st_size)
+                          for entry, file_stat in zip(py_entries, file_stats))
+        memo_key = (self.plugin_dir, self.base_class)
+        memo = _discovered_plugins.get(memo_key)
+        if memo is not None and memo[0] == signature:
+            self._set_plugins(memo[1])
+            # The modules have already run for another loader, take its classes as well.
+            self._plugin_classes = memo[2]
+            return [class_name for class_name, module in self.plugins]
+
+        cache = _DiscoveryCache(self.plugin_dir, self.base_class)
+        base_names = self._base_class_names()
+        plugins = []
+        found = [cache.get(entry.path, file_stat) for entry, file_stat in zip(py_entries, file_stats)]
+        misses = [ndx for ndx, class_names in enumerate(found) if class_names is None]
+        if len(misses) > 1:
+            # Reading and parsing the uncached files is independent per file, overlap the I/O.
+            with ThreadPoolExecutor(max_workers=min(8, len(misses), os.cpu_count() or 4)) as pool:
+                scanned = pool.map(lambda ndx: self._scan_class_names(py_entries[ndx].path, base_names), misses)
+                for ndx, class_names in zip(misses, scanned):
+                    found[ndx] = class_names
+        elif misses:
+            found[misses[0]] = self._scan_class_names(py_entries[misses[0]].path, base_names)
+        for ndx in misses:
+            cache.put(py_entries[ndx].path, file_stats[ndx], found[ndx])
+
+        for (module_name, entry), class_names in zip(py_files, found):
+            if class_names == _IMPORT_MODULE:
+                plugins.extend(self._load_plugin(module_name, entry.path, None))
+            elif class_names:
+                plugins.extend(self._load_plugin(module_name, entry.path, class_names))
+        cache.save()
+        self._set_plugins(tuple(plugins))
+        _discovered_plugins[memo_key] = (signature, self.plugins, None)
+
+        return [class_name for class_name, module in self.plugins]
+
+    def _set_plugins(self, plugins: tuple):
+        self.plugins = plugins
+        self._plugin_classes = None
+        self._plugins_by_name = None
+
+    def _base_class_names(self):
+        """
+        Names a plugin class can list in its bases: base_class and every subclass of it
+        that's already been imported.
+        """
+        names = {self.base_class.__name__}
+        pending = [self.base_class]
+        while pending:
+            for subclass in pending.pop().__subclasses__():
+                if subclass.__name__ not in names:
+                    names.add(subclass.__name__)
+                    pending.append(subclass)
+        return names
+
+    def _scan_class_names(self, module_path, base_names):
+        """
+        Parse module_path, without executing it, for the classes that may be plugins. A class,
+        at any depth, is kept if a base is one of base_names, a class that was kept, or
+        something imported (a base_class subclass we haven't imported yet). get_plugins() weeds
+        out the ones that turn out not to be plugins.
+        The scan falls back to _IMPORT_MODULE when it can't vouch for the result: the module has a
+        star import, calls type() to build a class, or has a class with a base, other than a
+        builtin, that isn't one of those names.
+        """
         try:
-          config_file = configparser.SafeConfigParser(
-            defaults={
-              'enabled': True,
-              'config': {},
-              'retry_count': 3,
-              'timeout': 30
-            }
-          )
-          config_file.read(config_file)
-
-          plugin_name = config_file.stem
-          configs[plugin_name] = PluginConfig(
-            name=plugin_name,
-            enabled=config_file.get('default', 'enabled'),
-            config=config_file.get('default', 'config'),
-            retry_count=config_file.get('default', 'retry_count'),
-            timeout=config_file.get('default', 'timeout')
-          )
-          logging.info(f"Loaded config for plugin: {plugin_name} from {config_dir}")
-
-        except Exception as e:
-          logging.error(f"Failed to load config from {config_file}: {str(e)}")
-
-    return configs
-
-  @staticmethod
-  def find_all_config_directories(plugin_dirs: Dict[str, str], additional_config_dirs: List[str] = None) -> List[str]:
-    """
-    Find all directories that should be searched for config files.
-
-    Args:
-        plugin_dirs: Dictionary of plugin directories
-        additional_config_dirs: Additional config directories to search
-
-    Returns:
-        List of all config directories to search
-    """
-    config_dirs = []
+            with open(module_path, 'rb') as source_file:
+                tree = ast.parse(source_file.read(), filename=module_path)
+        except (SyntaxError, ValueError, OSError) as e:
+            logger.error(f"Failed to parse plugin {module_path}: {str(e)}")
+            return []
+        candidate_names = set(base_names)
+        class_nodes = []
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                for alias in node.names:
+                    if alias.name == '*':
+                        return _IMPORT_MODULE
+                    candidate_names.add((alias.asname or alias.name).split('.')[0])
+            elif isinstance(node, ast.ClassDef):
+                class_nodes.append(node)
+            elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and \
+                    node.func.id == 'type' and len(node.args) == 3:
+                return _IMPORT_MODULE
+        if not class_nodes:
+            return []
+        # ast.walk is breadth first, go back to source order so a base class defined earlier in
+        # the file is kept before the classes that derive from it.
+        class_nodes.sort(key=lambda class_node: (class_node.lineno, class_node.col_offset))
+        class_names = []
+        for node in class_nodes:
+            unknown_base = False
+            for base in node.bases:
+                if isinstance(base, ast.Subscript):
+                    # Generic bases, "Base[T]".
+                    base = base.value
+                # "module.Base" can only be something imported.
+                if isinstance(base, ast.Attribute) or \
+                        (isinstance(base, ast.Name) and base.id in candidate_names):
+                    class_names.append(node.name)
+                    candidate_names.add(node.name)
+                    break
+                if not (isinstance(base, ast.Name) and hasattr(builtins, base.id)):
+                    unknown_base = True
+            else:
+                if unknown_base:
+                    # A base from an assignment, a call, ... the scan can't tell what it is.
+                    return _IMPORT_MODULE
+        return class_names
+
+    def _load_plugin(self, module_name, module_path, class_names):
+        """
+        Returns (class_name, module) pairs for class_names. The module is left unexecuted until
+        one of them is accessed. With class_names None the module is executed now and every
+        plugin class it defines is returned.
+        """
+        spec = self._finder.find_spec(module_name)
+        if spec is None or spec.origin != module_path:
+            # A package directory of the same name shadows the file for the finder.
+            spec = importlib.util.spec_from_file_location(module_name, module_path)
+        if spec and spec.loader:
+            if class_names is None:
+                module = importlib.util.module_from_spec(spec)
+                try:
+                    spec.loader.exec_module(module)
+                    class_names = list(self._find_plugins_in_module(module))
+                except Exception as e:
+                    logger.error(f"Failed to load plugin {module_name}: {e.__class__.__name__}: {str(e)}")
+                    return []
+                return [(class_name, module) for class_name in class_names]
+            spec.loader = importlib.util.LazyLoader(spec.loader)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            return [(class_name, module) for class_name in class_names]
+        return []
 
-    # Add plugin directories (configs can be co-located with plugins)
-    for plugin_dir in plugin_dirs.values():
-      config_dirs.append(plugin_dir)
+    def _find_plugins_in_module(self, module):
+        """
+        Returns the base_class subclasses defined in module, keyed by class name. Walks the
+        module dict directly rather than inspect.getmembers, which sorts dir() and getattr's
+        every name. Classes imported from elsewhere are skipped. A class whose __module__ doesn't
+        hold it, one built by type() with an ABCMeta base reports "abc", is taken as defined here.
+        """
+        base_class = self.base_class
+        module_name = module.__name__
+        is_plugin = self._is_plugin
+        found_plugins = {}
+        for name, obj in module.__dict__.items():
+            if isinstance(obj, type) and obj is not base_class and \
+                    (obj.__module__ == module_name or
+                     getattr(sys.modules.get(obj.__module__), obj.__name__, None) is not obj):
+                # Keyed on the class itself, which also keeps it alive for the life of the loader.
+                plugin = is_plugin.get(obj)
+                if plugin is None:
+                    plugin = is_plugin[obj] = issubclass(obj, base_class)
+                if plugin:
+                    found_plugins[obj.__name__] = obj
+        return found_plugins
 
-    # Add additional config directories
-    if additional_config_dirs:
-      config_dirs.extend(additional_config_dirs)
+    def get_plugins(self) -> tuple:
+        """
+        Resolve the discovered (class_name, module) pairs to classes, this is where a lazily
+        loaded module actually executes. Resolved once per discovery, the same tuple is
+        returned after that.
+        """
+        if self._plugin_classes is not None:
+            return self._plugin_classes
+        plugin_classes = []
+        module_plugins = {}
+        for class_name, module in self.plugins:
+            found_plugins = module_plugins.get(id(module))
+            if found_plugins is None:
+                # Touching module.__dict__ runs a lazily loaded module, this is where a broken
+                # plugin fails. One line is enough, skip the traceback formatting.
+                try:
+                    found_plugins = self._find_plugins_in_module(module)
+                except Exception as e:
+                    logger.error(f"Failed to load plugin {module.__name__}: {e.__class__.__name__}: {str(e)}")
+                    found_plugins = {}
+                module_plugins[id(module)] = found_plugins
+            plugin_class = found_plugins.get(class_name)
+            # The source scan matches on names, candidates that aren't plugins are dropped here.
+            if plugin_class is not None:
+                plugin_classes.append(plugin_class)
+        self._plugin_classes = tuple(plugin_classes)
+        memo_key = (self.plugin_dir, self.base_class)
+        memo = _discovered_plugins.get(memo_key)
+        if memo is not None and memo[1] is self.plugins:
+            _discovered_plugins[memo_key] = (memo[0], memo[1], self._plugin_classes)
+        return self._plugin_classes
+
+    def invalidate(self):
+        """
+        Forget what's been discovered and parsed for plugin_dir and config_dirs, in this
+        loader and the process wide caches, so the next calls rescan and reload everything.
+        """
+        _discovered_plugins.pop((self.plugin_dir, self.base_class), None)
+        for config_path in list(_parsed_configs):
+            if os.path.dirname(config_path) in self.config_dirs:
+                del _parsed_configs[config_path]
+        self._set_plugins(())
+        self.configs = {}
 
-    return config_dirs
-'''
\ No newline at end of file
+    @property
+    def plugins_by_name(self) -> Mapping[str, Type]:
+        """Read only mapping of plugin class name to class."""
+        if self._plugins_by_name is None:
+            self._plugins_by_name = MappingProxyType({plugin_class.__name__: plugin_class
+                                                      for plugin_class in self.get_plugins()})
+        return self._plugins_by_name
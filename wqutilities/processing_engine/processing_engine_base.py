@@ -1,15 +1,53 @@
-from datetime import datetime
 from typing import Dict, Any, List, Callable, Generic
+import asyncio
+import collections
+import functools
+import inspect
+import itertools
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import queue
+import sys
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 from .plugin_loader import PluginLoader
 from .plugin_base import BaseCollectorPlugin, BaseOutputPlugin, T, PluginConfig
 
 logger = logging.getLogger(__name__)
 
+
+def _drain_log_queue(log_queue, engine_logger):
+  #Only gets the queue and the logger, a reference to the engine here would keep an unclosed one alive.
+  while True:
+    record = log_queue.get()
+    if record is None:
+      break
+    engine_logger.handle(record)
+
+
+def _stop_log_thread(log_queue, log_thread):
+  if log_thread.is_alive():
+    log_queue.put(None)
+    log_thread.join()
+
+
 class GenericProcessingEngine(Generic[T]):
     """Generic processing engine for any data type with plugin management."""
+    # Subclasses that add attributes without declaring __slots__ get a __dict__ back.
+    __slots__ = ('base_directoy', 'collector_plugins', 'output_plugins',
+                 '_collector_data_types', '_output_supported_types',
+                 '_outputs_by_type', '_should_send_outputs',
+                 '_collector_status_templates', '_output_status_templates',
+                 'data_items', 'max_data_items', 'max_workers', 'logger',
+                 '_log_queue', '_log_thread', '_stop_logging', 'running', 'filters', 'processors',
+                 '_compiled_filter', '_compiled_processor', '_pipeline_key',
+                 'process_data_batch', 'distribute_data_batch',
+                 '_collector_executor', '_output_executor', '_hung_calls',
+                 'plugin_dirs', 'plugins_enabled', 'config_dirs', '__weakref__')
+    # Worker pool attribute -> the thread name prefix its pools are created with.
+    _POOL_PREFIXES = {'_collector_executor': "collector", '_output_executor': "output"}
 
     def __init__(self, max_workers: int = 5,
                  base_directoy: Path = Path("."),
@@ -17,18 +55,45 @@ class GenericProcessingEngine(Generic[T]):
                  plugins_enabled: Dict[str, bool] = None,
                  config_dirs: List[str] = None,
                  process_data_batch: bool = True,
-                 distribute_data_batch: bool = True):
+                 distribute_data_batch: bool = True,
+                 max_data_items: int = 10000):
       self.base_directoy = base_directoy
       self.collector_plugins: Dict[str, BaseCollectorPlugin[T]] = {}
       self.output_plugins: Dict[str, BaseOutputPlugin[T]] = {}
-      self.data_items: Dict[str, T] = {}
+      self._collector_data_types: Dict[str, str] = {}
+      self._output_supported_types: Dict[str, List[str]] = {}
+      # Output plugin names bucketed by the item_type they take, and the plugins that override
+      # should_send so have to look at every item. Rebuilt when an output plugin registers.
+      self._outputs_by_type: Dict[str, List[str]] = {}
+      self._should_send_outputs: List[str] = []
+      # Per plugin get_status entries holding the fields that don't change after registration.
+      self._collector_status_templates: Dict[str, Dict[str, Any]] = {}
+      self._output_status_templates: Dict[str, Dict[str, Any]] = {}
+      # Most recently processed items by item_id, oldest are dropped past max_data_items.
+      self.data_items: Dict[str, T] = collections.OrderedDict()
+      self.max_data_items = max_data_items
       self.max_workers = max_workers
       self.logger = logger
+      # Per cycle log records are handed to a logging thread so the collection and send
+      # loops don't wait on the handlers.
+      self._log_queue = queue.SimpleQueue()
+      self._log_thread = threading.Thread(target=_drain_log_queue, args=(self._log_queue, self.logger),
+                                          name="engine-logging", daemon=True)
+      self._log_thread.start()
+      # Flushes the queue and stops the thread on close(), when an unclosed engine is collected, or at exit.
+      self._stop_logging = weakref.finalize(self, _stop_log_thread, self._log_queue, self._log_thread)
       self.running = False
       self.filters: List[Callable[[T], bool]] = []
       self.processors: List[Callable[[T], T]] = []
+      self._compile_pipeline()
       self.process_data_batch = process_data_batch
       self.distribute_data_batch = distribute_data_batch
+      # Worker pools live as long as the engine so each cycle doesn't start and join threads.
+      for pool_attr, prefix in self._POOL_PREFIXES.items():
+        setattr(self, pool_attr, ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=prefix))
+      # (pool attribute, plugin name) -> future for calls that ran past their timeout and are still
+      # holding a worker thread. The plugin isn't submitted again until the call returns.
+      self._hung_calls: Dict[tuple, Any] = {}
 
       # Plugin directories
       self.plugin_dirs = plugin_dirs or {
@@ -42,6 +107,7 @@ class GenericProcessingEngine(Generic[T]):
       }
 
       # Config directories - can include plugin directories and additional paths
+      self.config_dirs = config_dirs or []
       '''
       additional_config_dirs = config_dirs or []
       self.config_dirs = PluginLoader.find_all_config_directories(
@@ -54,19 +120,16 @@ class GenericProcessingEngine(Generic[T]):
       """Automatically load all plugins from configured directories."""
       self.logger.info("Auto-loading plugins from directories")
 
-      collector_plugins = PluginLoader(self.plugin_dirs['collectors'],
-                                          [],
-                                          BaseCollectorPlugin)
-      # Load plugins and configurations
-      collector_plugin_configs = collector_plugins.load_plugin_configs()
-
-      # Load collector plugins
-      collector_classes = collector_plugins.discover_plugins()
+      # The two directories are independent, so the output plugins are scanned and imported
+      # on the output pool while the collectors load here. Registration stays on this thread.
+      output_load = self._output_executor.submit(self._load_plugin_classes, self.plugin_dirs['outputs'], BaseOutputPlugin)
+      collector_plugin_configs, collector_classes = self._load_plugin_classes(self.plugin_dirs['collectors'], BaseCollectorPlugin)
+      output_plugin_configs, output_classes = output_load.result()
 
       for plugin_class in collector_classes:
+        class_name = plugin_class.__name__
         try:
-          class_name = plugin_class.__name__
-          config = collector_plugin_configs.get(class_name, PluginConfig(class_name))
+          config = self._plugin_config(collector_plugin_configs, class_name)
           config.base_directory = self.base_directoy
           # Create and register plugin instance
           plugin_instance = plugin_class(config)
@@ -76,18 +139,10 @@ class GenericProcessingEngine(Generic[T]):
           self.logger.error(f"Failed to instantiate collector plugin {class_name}: {str(e)}")
           self.logger.exception(e)
 
-      output_plugin_loader = PluginLoader(self.plugin_dirs['outputs'],
-                                          [],
-                                          BaseOutputPlugin)
-      output_plugin_configs = output_plugin_loader.load_plugin_configs()
-
-      # Load output plugins
-      output_classes = output_plugin_loader.discover_plugins()
-
       for plugin_class in output_classes:
+        class_name = plugin_class.__name__
         try:
-          class_name = plugin_class.__name__
-          config = output_plugin_configs.get(class_name, PluginConfig(class_name))
+          config = self._plugin_config(output_plugin_configs, class_name)
           config.base_directory = self.base_directoy
 
           # Create and register plugin instance
@@ -98,161 +153,476 @@ class GenericProcessingEngine(Generic[T]):
           self.logger.error(f"Failed to instantiate output plugin {class_name}: {str(e)}")
           self.logger.exception(e)
 
+    def _load_plugin_classes(self, plugin_dir: str, base_class):
+      """Load the configs and plugin classes in plugin_dir, returns (configs, classes)."""
+      plugin_loader = PluginLoader(plugin_dir, [], base_class)
+      # Load plugins and configurations
+      plugin_configs = plugin_loader.load_plugin_configs()
+      plugin_loader.discover_plugins()
+      return plugin_configs, plugin_loader.get_plugins()
+
+    def _plugin_config(self, plugin_configs: Dict[str, PluginConfig], class_name: str) -> PluginConfig:
+      """Config for the plugin class by class name, the default PluginConfig is only built on a miss."""
+      config = plugin_configs.get(class_name)
+      if config is None:
+        config = PluginConfig(class_name)
+      return config
+
     def register_collector_plugin(self, plugin: BaseCollectorPlugin[T]):
-      """Register a collector plugin."""
+      """Register a collector plugin. Registering the same instance again is a no-op."""
+      plugin_name = plugin.get_plugin_name()
+      if self.collector_plugins.get(plugin_name) is plugin:
+        return
       if not plugin.validate_config():
-        raise ValueError(f"Invalid configuration for plugin: {plugin.get_plugin_name()}")
+        raise ValueError(f"Invalid configuration for plugin: {plugin_name}")
 
-      plugin_name = plugin.get_plugin_name()
       self.collector_plugins[plugin_name] = plugin
+      # Fixed once the plugin is configured, get_status reads it from here.
+      self._collector_data_types[plugin_name] = plugin.get_data_type()
+      self._collector_status_templates[plugin_name] = {'data_type': self._collector_data_types[plugin_name]}
       self.logger.info(f"Registered collector plugin: {plugin_name}")
 
     def register_output_plugin(self, plugin: BaseOutputPlugin[T]):
-      """Register an output plugin."""
+      """Register an output plugin. Registering the same instance again is a no-op."""
+      plugin_name = plugin.get_plugin_name()
+      if self.output_plugins.get(plugin_name) is plugin:
+        return
       if not plugin.validate_config():
-        raise ValueError(f"Invalid configuration for plugin: {plugin.get_plugin_name()}")
+        raise ValueError(f"Invalid configuration for plugin: {plugin_name}")
 
-      plugin_name = plugin.get_plugin_name()
       self.output_plugins[plugin_name] = plugin
+      # Fixed once the plugin is configured, get_status reads it from here.
+      self._output_supported_types[plugin_name] = plugin.get_supported_data_types()
+      self._output_status_templates[plugin_name] = {'supported_types': self._output_supported_types[plugin_name]}
+      self._index_output_plugins()
       self.logger.info(f"Registered output plugin: {plugin_name}")
 
+    def _index_output_plugins(self):
+      """Bucket the output plugins by supported data type for _output_batches."""
+      outputs_by_type = {}
+      should_send_outputs = []
+      for plugin_name, plugin in self.output_plugins.items():
+        if type(plugin).should_send is BaseOutputPlugin.should_send:
+          for data_type in plugin.supported_types:
+            outputs_by_type.setdefault(data_type, []).append(plugin_name)
+        else:
+          should_send_outputs.append(plugin_name)
+      self._outputs_by_type = outputs_by_type
+      self._should_send_outputs = should_send_outputs
+
     def add_filter(self, filter_func: Callable[[T], bool]):
       """Add a filter function for data items."""
       self.filters.append(filter_func)
+      self._compile_pipeline()
 
     def add_processor(self, processor_func: Callable[[T], T]):
       """Add a processor function for data items."""
       self.processors.append(processor_func)
+      self._compile_pipeline()
+
+    def _compile_pipeline(self):
+      """
+      Fold the filters into a single short circuiting check and the processors into one
+      function, so the per item work is two calls.
+      """
+      filters = tuple(self.filters)
+      processors = tuple(self.processors)
+      if not filters:
+        compiled_filter = lambda data_item: True
+      elif len(filters) == 1:
+        compiled_filter = filters[0]
+      else:
+        def compiled_filter(data_item):
+          for filter_func in filters:
+            if not filter_func(data_item):
+              return False
+          return True
+      if not processors:
+        compiled_processor = lambda data_item: data_item
+      else:
+        compiled_processor = functools.reduce(lambda f, g: lambda data_item: g(f(data_item)), processors)
+      self._pipeline_key = (filters, processors)
+      self._compiled_filter = compiled_filter
+      self._compiled_processor = compiled_processor
+
+    def _pipeline(self):
+      # filters and processors are public lists, rebuild if they were changed directly.
+      if self._pipeline_key != (tuple(self.filters), tuple(self.processors)):
+        self._compile_pipeline()
+      return self._compiled_filter, self._compiled_processor
 
     def collect_all_data(self) -> List[T]:
       """Collect data from all enabled collector plugins."""
       all_data = []
 
-      with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-        future_to_plugin = {}
+      # Bound once per cycle rather than looked up for every submit.
+      submit = self._collector_executor.submit
+      collect_from_plugin = self._collect_from_plugin
+      future_to_plugin = {}
 
-        for plugin_name, plugin in self.collector_plugins.items():
-          if plugin.is_enabled():
-            future = executor.submit(self._collect_from_plugin, plugin)
-            future_to_plugin[future] = plugin_name
+      for plugin_name, plugin in self.collector_plugins.items():
+        if plugin.is_enabled() and not self._still_running('_collector_executor', plugin_name):
+          timed_out = threading.Event()
+          future = submit(collect_from_plugin, plugin, timed_out)
+          future_to_plugin[future] = (plugin_name, plugin, plugin.plugin_config.timeout, timed_out)
 
-        for future in as_completed(future_to_plugin):
-          plugin_name = future_to_plugin[future]
-          try:
-            data_items = future.result(timeout=self.collector_plugins[plugin_name].plugin_config.timeout)
-            all_data.extend(data_items)
-            self.logger.info(f"Collected {len(data_items)} items from {plugin_name}")
-          except Exception as e:
-            self.collector_plugins[plugin_name].handle_error(e)
+      for future in self._iter_completed(future_to_plugin, '_collector_executor'):
+        plugin_name, plugin, timeout, timed_out = future_to_plugin[future]
+        try:
+          data_items = future.result()
+          all_data.extend(data_items)
+          self._log(logging.INFO, "Collected %d items from %s", len(data_items), plugin_name)
+        except Exception as e:
+          plugin.handle_error(e)
 
       return all_data
 
-    def _collect_from_plugin(self, plugin: BaseCollectorPlugin[T]) -> List[T]:
+    def _iter_completed(self, future_to_plugin: Dict, pool_attr: str):
+      """
+      Yield the futures in future_to_plugin, future -> (plugin_name, plugin, timeout, timed_out, ...),
+      as they finish. Each wakeup drains everything that's done rather than one future at a time. A
+      future still running past its plugin's timeout is cancelled, reported to the plugin as an
+      error and dropped. Its timed_out event is set so a late failure isn't reported a second time.
+      """
+      pending = set(future_to_plugin)
+      started = time.monotonic()
+      while pending:
+        deadline = started + min(future_to_plugin[future][2] for future in pending)
+        done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                             return_when=FIRST_COMPLETED)
+        yield from done
+        now = time.monotonic()
+        for future in [future for future in pending if started + future_to_plugin[future][2] <= now]:
+          pending.discard(future)
+          plugin_name, plugin, timeout, timed_out = future_to_plugin[future][:4]
+          timed_out.set()
+          if not future.cancel():
+            self._abandon(pool_attr, plugin_name, future)
+          plugin.handle_error(self._timeout_error(plugin_name, timeout))
+
+    def _timeout_error(self, plugin_name: str, timeout: float) -> TimeoutError:
+      return TimeoutError(f"{plugin_name} did not finish within {timeout} seconds")
+
+    def _abandon(self, pool_attr: str, plugin_name: str, future):
+      """
+      A timed out call that has already started can't be stopped and keeps its worker thread until
+      it returns. The pool is swapped for a fresh one so the other plugins still get max_workers
+      threads, and the plugin is skipped until the call finishes so it can only hold one thread.
+      """
+      key = (pool_attr, plugin_name)
+      self._hung_calls[key] = future
+      future.add_done_callback(lambda done: self._hung_calls.pop(key, None) if self._hung_calls.get(key) is done else None)
+      self.logger.warning(f"{plugin_name} timed out and is still holding a worker thread, replacing the pool.")
+      pool = getattr(self, pool_attr)
+      setattr(self, pool_attr, ThreadPoolExecutor(max_workers=self.max_workers,
+                                                  thread_name_prefix=self._POOL_PREFIXES[pool_attr]))
+      # The old pool's threads exit once their current call returns.
+      pool.shutdown(wait=False)
+
+    def _still_running(self, pool_attr: str, plugin_name: str) -> bool:
+      """True if the plugin's call from an earlier cycle timed out and hasn't returned yet."""
+      if (pool_attr, plugin_name) in self._hung_calls:
+        self._log(logging.WARNING, "Skipping %s, its timed out call from an earlier cycle is still running", plugin_name)
+        return True
+      return False
+
+    def _collect_from_plugin(self, plugin: BaseCollectorPlugin[T], timed_out: threading.Event = None) -> List[T]:
       """Collect data from a single plugin."""
       try:
-        plugin.last_run = datetime.now()
+        plugin.last_run_ns = time.time_ns()
         return plugin.collect_data()
       except Exception as e:
-        plugin.handle_error(e)
+        # Past its timeout the error has already been reported.
+        if timed_out is None or not timed_out.is_set():
+          plugin.handle_error(e)
         return []
 
+    async def collect_all_data_async(self) -> List[T]:
+      """
+      Collect data from all enabled collector plugins concurrently on the running event loop.
+      Plugins that define a collect_data_async coroutine (or make collect_data one) are awaited
+      directly, sync plugins run on the collector pool.
+      """
+      all_data = []
+      enabled = [(plugin_name, plugin) for plugin_name, plugin in self.collector_plugins.items()
+                 if plugin.is_enabled() and not self._still_running('_collector_executor', plugin_name)]
+      results = await asyncio.gather(
+        *(self._collect_from_plugin_async(plugin_name, plugin) for plugin_name, plugin in enabled),
+        return_exceptions=True)
+
+      for (plugin_name, plugin), data_items in zip(enabled, results):
+        if isinstance(data_items, Exception):
+          plugin.handle_error(data_items)
+        else:
+          all_data.extend(data_items)
+          self._log(logging.INFO, "Collected %d items from %s", len(data_items), plugin_name)
+
+      return all_data
+
+    async def _collect_from_plugin_async(self, plugin_name: str, plugin: BaseCollectorPlugin[T]) -> List[T]:
+      """Collect data from a single plugin within its timeout, awaiting it if it's async."""
+      timeout = plugin.plugin_config.timeout
+      collect_async = getattr(plugin, 'collect_data_async', None)
+      if collect_async is None and inspect.iscoroutinefunction(plugin.collect_data):
+        collect_async = plugin.collect_data
+      if collect_async is None:
+        return await self._run_on_pool('_collector_executor', plugin_name, timeout, self._collect_from_plugin, plugin)
+      plugin.last_run_ns = time.time_ns()
+      return await self._await_with_timeout(plugin_name, timeout, collect_async())
+
+    async def _await_with_timeout(self, plugin_name: str, timeout: float, awaitable):
+      """Await an async plugin call, cancelling it if it runs past the plugin's timeout."""
+      try:
+        return await asyncio.wait_for(awaitable, timeout=timeout)
+      except asyncio.TimeoutError:
+        raise self._timeout_error(plugin_name, timeout) from None
+
+    async def _run_on_pool(self, pool_attr: str, plugin_name: str, timeout: float, call: Callable, *args):
+      """
+      Run a sync plugin call on the pool from the event loop. call gets a timed_out event after args
+      and a call that runs past the timeout is handled the same as in _iter_completed.
+      """
+      timed_out = threading.Event()
+      future = getattr(self, pool_attr).submit(call, *args, timed_out)
+      try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+      except asyncio.TimeoutError:
+        timed_out.set()
+        if not future.cancel():
+          self._abandon(pool_attr, plugin_name, future)
+        raise self._timeout_error(plugin_name, timeout) from None
+
     def process_data(self, data_items: List[T]) -> List[T]:
       """Process data items through filters and processors."""
       processed_data = []
-
+      compiled_filter, compiled_processor = self._pipeline()
+      # Bound once, not looked up again for every item.
+      engine_items = self.data_items
+      move_to_end = engine_items.move_to_end
+      merge_item = self._merge_item
+      add_processed = processed_data.append
+
+      # Apply filters as one pass over the batch, then processors to what's left.
+      if self.filters:
+        data_items = list(itertools.compress(data_items, map(compiled_filter, data_items)))
+      if self.processors:
+        data_items = map(compiled_processor, data_items)
       for data_item in data_items:
-        # Apply filters
-        if all(filter_func(data_item) for filter_func in self.filters):
-          # Apply processors
-          for processor_func in self.processors:
-            data_item = processor_func(data_item)
+        data_item = merge_item(engine_items, data_item)
 
-          processed_data.append(data_item)
-          self.data_items[data_item.item_id] = data_item
+        add_processed(data_item)
+        item_id = data_item.item_id
+        engine_items[item_id] = data_item
+        move_to_end(item_id)
+      self._trim_data_items()
 
       return processed_data
+
     def batch_process_data(self, data_items: List[T]) -> List[T]:
       """Process data items through filters and processors."""
       processed_data = []
+      compiled_filter, compiled_processor = self._pipeline()
 
-      # Apply filters
-      if all(filter_func(data_items) for filter_func in self.filters):
-        # Apply processors
-        for processor_func in self.processors:
-          data_items = processor_func(data_items)
+      # Apply filters, then processors
+      if compiled_filter(data_items):
+        data_items = compiled_processor(data_items)
 
-        processed_data = data_items
+        engine_items = self.data_items
+        merge_item = self._merge_item
+        processed_data = [merge_item(engine_items, data_item) for data_item in data_items]
         #processed_data.extend(data_items)
-        for data_item in self.data_items:
-          self.data_items[data_item.item_id] = data_item
+        move_to_end = engine_items.move_to_end
+        for data_item in processed_data:
+          item_id = data_item.item_id
+          engine_items[item_id] = data_item
+          move_to_end(item_id)
+        self._trim_data_items()
 
       return processed_data
 
+    def _merge_item(self, engine_items: Dict[str, T], data_item: T) -> T:
+      """
+      If an item with the same id is already held and it supports update_from, fold the new
+      item into it and return the existing instance, so an item id keeps one object across
+      cycles.
+      """
+      existing = engine_items.get(data_item.item_id)
+      if existing is None or existing is data_item or type(existing) is not type(data_item):
+        return data_item
+      update_from = getattr(existing, 'update_from', None)
+      if update_from is None:
+        return data_item
+      update_from(data_item)
+      return existing
+
+    def _trim_data_items(self):
+      """Drop the least recently processed items past max_data_items."""
+      engine_items = self.data_items
+      while len(engine_items) > self.max_data_items:
+        engine_items.popitem(last=False)
+
+    def _output_batches(self, data_items: List[T]) -> Dict[str, List[T]]:
+      """
+      Work out which items go to which enabled output plugin, returns plugin name to items.
+      Plugins that don't override should_send are looked up by the item's item_type, so an
+      item is only handed to the plugins that take its type. The rest get a should_send call
+      per item.
+      """
+      output_plugins = self.output_plugins
+      enabled = {plugin_name for plugin_name, plugin in output_plugins.items() if plugin.is_enabled()}
+      plugin_batches = {}
+      if not enabled:
+        return plugin_batches
+      outputs_by_type = self._outputs_by_type
+      for data_item in data_items:
+        for plugin_name in outputs_by_type.get(data_item.item_type, ()):
+          if plugin_name in enabled:
+            batch = plugin_batches.get(plugin_name)
+            if batch is None:
+              batch = plugin_batches[plugin_name] = []
+            batch.append(data_item)
+      for plugin_name in self._should_send_outputs:
+        if plugin_name in enabled:
+          should_send = output_plugins[plugin_name].should_send
+          batch = [data_item for data_item in data_items if should_send(data_item)]
+          if batch:
+            plugin_batches[plugin_name] = batch
+      return plugin_batches
+
     def distribute_data(self, data_items: List[T]):
-      """Distribute data items to all enabled output plugins."""
-      with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-        futures = []
-
-        for data_item in data_items:
-          for plugin_name, plugin in self.output_plugins.items():
-            if plugin.is_enabled() and plugin.should_send(data_item):
-              future = executor.submit(self._send_via_plugin, plugin, data_item)
-              futures.append((future, plugin_name, data_item.item_id))
-
-        for future, plugin_name, item_id in futures:
-          try:
-            success = future.result(timeout=self.output_plugins[plugin_name].config.timeout)
-            if success:
-              self.output_plugins[plugin_name].sent_count += 1
-              self.logger.info(f"Sent item {item_id} via {plugin_name}")
-          except Exception as e:
-            self.output_plugins[plugin_name].handle_error(e)
+      """Distribute data items to all enabled output plugins, one send_batch call per plugin."""
+      submit = self._output_executor.submit
+      send_batch_via_plugin = self._send_batch_via_plugin
+      output_plugins = self.output_plugins
+      future_to_plugin = {}
+
+      for plugin_name, batch in self._output_batches(data_items).items():
+        if self._still_running('_output_executor', plugin_name):
+          continue
+        plugin = output_plugins[plugin_name]
+        timed_out = threading.Event()
+        future = submit(send_batch_via_plugin, plugin, batch, timed_out)
+        future_to_plugin[future] = (plugin_name, plugin, plugin.plugin_config.timeout, timed_out, len(batch))
+
+      for future in self._iter_completed(future_to_plugin, '_output_executor'):
+        plugin_name, plugin, timeout, timed_out, item_count = future_to_plugin[future]
+        try:
+          sent = future.result()
+          if sent:
+            plugin.sent_count += sent
+            self._log(logging.INFO, "Sent %d of %d items via %s", sent, item_count, plugin_name)
+        except Exception as e:
+          plugin.handle_error(e)
 
     def batch_distribute_data(self, data_items: List[T]):
       """Distribute data items to all enabled output plugins."""
-      plugin_batches = {}
+      plugin_batches = self._output_batches(data_items)
+
+      submit = self._output_executor.submit
+      send_via_plugin_batch = self._send_via_plugin_batch
+      output_plugins = self.output_plugins
+      future_to_plugin = {}
+      for plugin_name, items in plugin_batches.items():
+        if self._still_running('_output_executor', plugin_name):
+          continue
+        plugin = output_plugins[plugin_name]
+        # Use batch sending if supported
+        timed_out = threading.Event()
+        future = submit(send_via_plugin_batch, plugin, items, timed_out)
+        future_to_plugin[future] = (plugin_name, plugin, plugin.plugin_config.timeout, timed_out, len(items))
+
+      for future in self._iter_completed(future_to_plugin, '_output_executor'):
+        plugin_name, plugin, timeout, timed_out, item_count = future_to_plugin[future]
+        try:
+          success = future.result()
+          if success:
+            plugin.sent_count += item_count
+            #self.output_plugins[plugin_name].sent_count += 1
+            self._log(logging.INFO, "Sent %d items via %s", item_count, plugin_name)
+        except Exception as e:
+          plugin.handle_error(e)
+
+    async def distribute_data_async(self, data_items: List[T]):
+      """
+      Distribute data items to all enabled output plugins concurrently on the running event loop,
+      one send per plugin when distribute_data_batch is set, otherwise one task per plugin that
+      sends its items one at a time.
+      """
+      sends = []
+      batch = self.distribute_data_batch
+      for plugin_name, items in self._output_batches(data_items).items():
+        if self._still_running('_output_executor', plugin_name):
+          continue
+        plugin = self.output_plugins[plugin_name]
+        sends.append((plugin_name, plugin, len(items), self._send_to_plugin_async(plugin_name, plugin, items)))
+
+      results = await asyncio.gather(*(send for plugin_name, plugin, item_count, send in sends),
+                                     return_exceptions=True)
+
+      for (plugin_name, plugin, item_count, send), sent in zip(sends, results):
+        if isinstance(sent, Exception):
+          plugin.handle_error(sent)
+        elif sent:
+          # A batch send reports success, the per item path reports how many went out.
+          if batch:
+            sent = item_count
+          plugin.sent_count += sent
+          self._log(logging.INFO, "Sent %d items via %s", sent, plugin_name)
+
+    async def _send_to_plugin_async(self, plugin_name: str, plugin: BaseOutputPlugin[T], data_items: List[T]):
+      """
+      Send data items via a single output plugin within its timeout. A sync plugin's send goes to
+      the output pool as one task, as send_data of the whole batch when distribute_data_batch is set,
+      otherwise as send_batch.
+      """
+      timeout = plugin.plugin_config.timeout
+      if getattr(plugin, 'send_data_async', None) is None and not inspect.iscoroutinefunction(plugin.send_data):
+        send = self._send_via_plugin_batch if self.distribute_data_batch else self._send_batch_via_plugin
+        return await self._run_on_pool('_output_executor', plugin_name, timeout, send, plugin, data_items)
+      if self.distribute_data_batch:
+        send = self._send_via_plugin_async(plugin, data_items)
+      else:
+        send = self._send_items_async(plugin, data_items)
+      return await self._await_with_timeout(plugin_name, timeout, send)
 
-      for data_item in data_items:
-        for plugin_name, plugin in self.output_plugins.items():
-          if plugin.is_enabled() and plugin.should_send(data_item):
-            if plugin_name not in plugin_batches:
-              plugin_batches[plugin_name] = []
-            plugin_batches[plugin_name].append(data_item)
-
-      with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-        futures = []
-        for plugin_name, items in plugin_batches.items():
-          plugin = self.output_plugins[plugin_name]
-          # Use batch sending if supported
-          future = executor.submit(self._send_via_plugin_batch, plugin, items)
-          futures.append((future, plugin_name, len(items)))
-
-        '''
-        #for data_item in data_items:
-        for plugin_name, plugin in self.output_plugins.items():
-          for data_item in data_items:
-            if plugin.is_enabled() and plugin.should_send(data_item):
-              future = executor.submit(self._send_via_plugin, plugin, data_items)
-              futures.append((future, plugin_name, data_items.item_id))
-        '''
-        for future, plugin_name, item_id in futures:
-          try:
-            success = future.result(timeout=self.output_plugins[plugin_name].plugin_config.timeout)
-            if success:
-              self.output_plugins[plugin_name].sent_count += len(data_items)
-              #self.output_plugins[plugin_name].sent_count += 1
-              self.logger.info(f"Sent item {item_id} via {plugin_name}")
-          except Exception as e:
-            self.output_plugins[plugin_name].handle_error(e)
-
-    def _send_via_plugin_batch(self, plugin: BaseOutputPlugin[T], data_items: List[T]) -> bool:
+    async def _send_items_async(self, plugin: BaseOutputPlugin[T], data_items: List[T]) -> int:
+      """Send data items one at a time via a single async output plugin, returns the number sent."""
+      results = await asyncio.gather(*(self._send_via_plugin_async(plugin, data_item) for data_item in data_items))
+      return sum(1 for success in results if success)
+
+    async def _send_via_plugin_async(self, plugin: BaseOutputPlugin[T], data) -> bool:
+      """Send via a single async output plugin."""
+      send_async = getattr(plugin, 'send_data_async', None)
+      try:
+        if send_async is not None:
+          return await send_async(data)
+        return await plugin.send_data(data)
+      except Exception as e:
+        plugin.handle_error(e)
+        return False
+
+    def _send_via_plugin_batch(self, plugin: BaseOutputPlugin[T], data_items: List[T],
+                               timed_out: threading.Event = None) -> bool:
       """Send data item via a single output plugin."""
       try:
         return plugin.send_data(data_items)
       except Exception as e:
-        plugin.handle_error(e)
+        # Past its timeout the error has already been reported.
+        if timed_out is None or not timed_out.is_set():
+          plugin.handle_error(e)
         return False
 
+    def _send_batch_via_plugin(self, plugin: BaseOutputPlugin[T], data_items: List[T],
+                               timed_out: threading.Event = None) -> int:
+      """Send data items via a single output plugin's send_batch, returns the number sent."""
+      try:
+        return plugin.send_batch(data_items)
+      except Exception as e:
+        # Past its timeout the error has already been reported.
+        if timed_out is None or not timed_out.is_set():
+          plugin.handle_error(e)
+        return 0
+
     def _send_via_plugin(self, plugin: BaseOutputPlugin[T], data_item: T) -> bool:
       """Send data item via a single output plugin."""
       try:
@@ -263,18 +633,18 @@ class GenericProcessingEngine(Generic[T]):
 
     def run_once(self):
       """Run the processing engine once."""
-      self.logger.info("Starting processing cycle")
+      self._log(logging.INFO, "Starting processing cycle")
 
       # Collect data
       collected_data = self.collect_all_data()
-      self.logger.info(f"Collected {len(collected_data)} total items")
+      self._log(logging.INFO, "Collected %d total items", len(collected_data))
 
       # Process data
       if self.process_data_batch:
         processed_data = self.batch_process_data(collected_data)
       else:
         processed_data = self.process_data(collected_data)
-      self.logger.info(f"Processed {len(processed_data)} items")
+      self._log(logging.INFO, "Processed %d items", len(processed_data))
 
       # Distribute data
       if processed_data:
@@ -283,10 +653,63 @@ class GenericProcessingEngine(Generic[T]):
         else:
           self.distribute_data(processed_data)
 
-      self.logger.info("Processing cycle complete")
+      self._log(logging.INFO, "Processing cycle complete")
+
+    async def run_once_async(self):
+      """Run the processing engine once on the running event loop."""
+      self._log(logging.INFO, "Starting processing cycle")
+
+      # Collect data
+      collected_data = await self.collect_all_data_async()
+      self._log(logging.INFO, "Collected %d total items", len(collected_data))
+
+      # Process data
+      if self.process_data_batch:
+        processed_data = self.batch_process_data(collected_data)
+      else:
+        processed_data = self.process_data(collected_data)
+      self._log(logging.INFO, "Processed %d items", len(processed_data))
+
+      # Distribute data
+      if processed_data:
+        await self.distribute_data_async(processed_data)
+
+      self._log(logging.INFO, "Processing cycle complete")
+
+    def _log(self, level: int, msg: str, *args):
+      """
+      Queue an INFO or lower record for the logging thread, the message is only formatted by the handlers.
+      Warnings and errors are logged here so they stay in order with the plugins' own error logging.
+      """
+      if not self.logger.isEnabledFor(level):
+        return
+      caller = sys._getframe(1)
+      record = self.logger.makeRecord(self.logger.name, level, caller.f_code.co_filename, caller.f_lineno,
+                                      msg, args, None, func=caller.f_code.co_name)
+      if level >= logging.WARNING:
+        self.logger.handle(record)
+      else:
+        self._log_queue.put(record)
+
+    def close(self):
+      """Shut down the worker pools, waiting for anything still running, then flush the log queue."""
+      self._collector_executor.shutdown(wait=True)
+      self._output_executor.shutdown(wait=True)
+      self._stop_logging()
+
+    def __enter__(self):
+      return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+      # Shut the pools down however the with block ends, including an exception out of run_once.
+      self.close()
+      return False
 
     def get_status(self) -> Dict[str, Any]:
       """Get engine status and statistics."""
+      # Only the fields that change between calls are read off the plugins.
+      collector_templates = self._collector_status_templates
+      output_templates = self._output_status_templates
       return {
         'running': self.running,
         'total_data_items': len(self.data_items),
@@ -294,17 +717,17 @@ class GenericProcessingEngine(Generic[T]):
         'config_directories': self.config_dirs,
         'collector_plugins': {
           name: {
+            **collector_templates[name],
             'status': plugin.status.value,
-            'data_type': plugin.get_data_type(),
-            'last_run': plugin.last_run.isoformat() if plugin.last_run else None,
+            'last_run': plugin.last_run_isoformat(),
             'error_count': plugin.error_count
           }
           for name, plugin in self.collector_plugins.items()
         },
         'output_plugins': {
           name: {
+            **output_templates[name],
             'status': plugin.status.value,
-            'supported_types': plugin.get_supported_data_types(),
             'sent_count': plugin.sent_count,
             'error_count': plugin.error_count
           }
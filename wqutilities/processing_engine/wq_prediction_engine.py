@@ -2,7 +2,6 @@ import logging.config
 from yapsy.PluginManager import PluginManager
 from pytz import timezone
 import time
-from .processing_engine_base import ProcessingEngine
 from ..data_plugins.data_plugin import DataCollectorPlugin
 
 logger = logging.getLogger(__name__)
@@ -14,20 +13,30 @@ class ProcessingEngine:
   def initialize_engine(self, **kwargs):
     raise "Must be implemented by child class"
 
-  def data_collector(self, **kwargs):
-    self.logger.info("Begin collect_data")
-
+  def collect_plugins(self, category, plugin_directories):
+    '''
+    Builds a yapsy PluginManager for the category and loads the plugins found in plugin_directories.
+    :param category: Category name the plugins are filed under.
+    :param plugin_directories: Directories to search for plugins.
+    :return: The PluginManager with the plugins collected.
+    '''
     simplePluginManager = PluginManager()
     logging.getLogger('yapsy').setLevel(logging.DEBUG)
     simplePluginManager.setCategoriesFilter({
-       "DataCollector": DataCollectorPlugin
+       category: DataCollectorPlugin
        })
 
     # Tell it the default place(s) where to find plugins
-    self.logger.debug("Plugin directories: %s" % (kwargs['data_collector_plugin_directories']))
-    simplePluginManager.setPluginPlaces(kwargs['data_collector_plugin_directories'])
+    self.logger.debug("Plugin directories: %s" % (plugin_directories))
+    simplePluginManager.setPluginPlaces(plugin_directories)
 
     simplePluginManager.collectPlugins()
+    return simplePluginManager
+
+  def data_collector(self, **kwargs):
+    self.logger.info("Begin collect_data")
+
+    simplePluginManager = self.collect_plugins("DataCollector", kwargs['data_collector_plugin_directories'])
 
     plugin_cnt = 0
     plugin_start_time = time.time()
@@ -51,17 +60,7 @@ class ProcessingEngine:
 
     self.logger.info("Begin run_output_plugins")
 
-    simplePluginManager = PluginManager()
-    logging.getLogger('yapsy').setLevel(logging.DEBUG)
-    simplePluginManager.setCategoriesFilter({
-       "OutputResults": DataCollectorPlugin
-       })
-
-    # Tell it the default place(s) where to find plugins
-    self.logger.debug("Plugin directories: %s" % (kwargs['output_plugin_directories']))
-    simplePluginManager.setPluginPlaces(kwargs['output_plugin_directories'])
-
-    simplePluginManager.collectPlugins()
+    simplePluginManager = self.collect_plugins("OutputResults", kwargs['output_plugin_directories'])
 
     plugin_cnt = 0
     plugin_start_time = time.time()
@@ -93,67 +92,3 @@ class WQPredictionEngine(ProcessingEngine):
 
   def run_wq_models(self, **kwargs):
     raise "Must be implemented by child class"
-
-  def data_collector(self, **kwargs):
-    self.logger.info("Begin collect_data")
-
-    simplePluginManager = PluginManager()
-    logging.getLogger('yapsy').setLevel(logging.DEBUG)
-    simplePluginManager.setCategoriesFilter({
-       "DataCollector": DataCollectorPlugin
-       })
-
-    # Tell it the default place(s) where to find plugins
-    self.logger.debug("Plugin directories: %s" % (kwargs['data_collector_plugin_directories']))
-    simplePluginManager.setPluginPlaces(kwargs['data_collector_plugin_directories'])
-
-    simplePluginManager.collectPlugins()
-
-    plugin_cnt = 0
-    plugin_start_time = time.time()
-    for plugin in simplePluginManager.getAllPlugins():
-      self.logger.info("Starting plugin: %s" % (plugin.name))
-      if plugin.plugin_object.initialize_plugin(details=plugin.details):
-        plugin.plugin_object.start()
-      else:
-        self.logger.error("Failed to initialize plugin: %s" % (plugin.name))
-      plugin_cnt += 1
-
-    #Wait for the plugings to finish up.
-    self.logger.info("Waiting for %d plugins to complete." % (plugin_cnt))
-    for plugin in simplePluginManager.getAllPlugins():
-      plugin.plugin_object.join()
-      plugin.plugin_object.finalize()
-
-    self.logger.info("%d Plugins completed in %f seconds" % (plugin_cnt, time.time() - plugin_start_time))
-
-
-  def output_data(self, **kwargs):
-
-    self.logger.info("Begin run_output_plugins")
-
-    simplePluginManager = PluginManager()
-    logging.getLogger('yapsy').setLevel(logging.DEBUG)
-    simplePluginManager.setCategoriesFilter({
-       "OutputResults": DataCollectorPlugin
-       })
-
-    # Tell it the default place(s) where to find plugins
-    self.logger.debug("Plugin directories: %s" % (kwargs['output_plugin_directories']))
-    simplePluginManager.setPluginPlaces(kwargs['output_plugin_directories'])
-
-    simplePluginManager.collectPlugins()
-
-    plugin_cnt = 0
-    plugin_start_time = time.time()
-    for plugin in simplePluginManager.getAllPlugins():
-      self.logger.info("Starting plugin: %s" % (plugin.name))
-      if plugin.plugin_object.initialize_plugin(details=plugin.details):
-        plugin.plugin_object.emit(prediction_date=kwargs['prediction_date'].astimezone(timezone("US/Eastern")).strftime("%Y-%m-%d %H:%M:%S"),
-                                  execution_date=kwargs['prediction_run_date'].strftime("%Y-%m-%d %H:%M:%S"),
-                                  ensemble_tests=kwargs['site_model_ensemble'])
-        plugin_cnt += 1
-      else:
-        self.logger.error("Failed to initialize plugin: %s" % (plugin.details))
-    self.logger.debug("%d output plugins run in %f seconds" % (plugin_cnt, time.time() - plugin_start_time))
-    self.logger.info("Finished collect_data")
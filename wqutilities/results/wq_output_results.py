@@ -2,75 +2,78 @@ import os
 import logging.config
 import time
 import json
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 import geojson
+from .. import json_utils
 from ..string_cleaners import safe_filename
 
+def sample_date_string(date_time):
+  '''
+  Formats date_time as '%Y-%m-%d %H:%M:%S'. isoformat produces the same text quicker than
+  strftime, any timezone is dropped first so no UTC offset is appended, as with strftime.
+  '''
+  if date_time.tzinfo is not None:
+    date_time = date_time.replace(tzinfo=None)
+  return date_time.isoformat(sep=' ', timespec='seconds')
+
 def contains(list, filter):
+  '''
+  Deprecated, nothing in the package uses it anymore. Use any(filter(x) for x in list).
+  '''
+  warnings.warn("contains() is deprecated, use any(filter(x) for x in list)", DeprecationWarning, stacklevel=2)
   for x in list:
     if filter(x):
       return True
   return False
 
 class WQSampleData:
+  #One of these per measurement, so no per instance __dict__.
+  __slots__ = ('station', 'date_time', 'value', 'units', 'sample_type')
+
   def __init__(self, **kwargs):
-    self._station = kwargs.get('station', None)
-    self._date_time = kwargs.get('date_time', None)
-    self._value = kwargs.get('value', None)
-    self._units = kwargs.get('units', None)
-    self._sample_type = kwargs.get('sample_type', None)
+    self.station = kwargs.get('station', None)
+    self.date_time = kwargs.get('date_time', None)
+    self.value = kwargs.get('value', None)
+    self.units = kwargs.get('units', None)
+    self.sample_type = kwargs.get('sample_type', None)
 
+  #Read only aliases for the underscored fields these used to be stored in, kept for one
+  #release for outside code that reads them. Use the plain names.
   @property
-  def station(self):
-    return self._station
-  @station.setter
-  def station(self, station):
-    self._station = station
+  def _station(self):
+    return self.station
 
   @property
-  def date_time(self):
-    return self._date_time
-  @date_time.setter
-  def date_time(self, date_time):
-    self._date_time = date_time
+  def _date_time(self):
+    return self.date_time
 
   @property
-  def value(self):
-    return self._value
-  @value.setter
-  def value(self, value):
-    self._value = value
+  def _value(self):
+    return self.value
 
   @property
-  def units(self):
-    return self._units
-  @units.setter
-  def units(self, units):
-    self._units = units
+  def _units(self):
+    return self.units
 
   @property
-  def sample_type(self):
-    return self._sample_type
-  @sample_type.setter
-  def sample_type(self, sample_type):
-    self._sample_type = sample_type
+  def _sample_type(self):
+    return self.sample_type
 
 class WQSamplesCollection:
   def __init__(self):
     self._wq_samples = {}
 
   def __len__(self):
-    return len(self._wq_samples.keys())
+    return len(self._wq_samples)
 
   def append(self, wq_sample):
+    wq_samples = self._wq_samples
     if type(wq_sample) is list:
       for sample in wq_sample:
-        if sample.station not in self._wq_samples:
-          self._wq_samples[wq_sample.station] = []
-        self._wq_samples[wq_sample.station].append(sample)
+        wq_samples.setdefault(sample.station, []).append(sample)
     else:
-      if wq_sample.station not in self._wq_samples:
-        self._wq_samples[wq_sample.station] = []
-      self._wq_samples[wq_sample.station].append(wq_sample)
+      wq_samples.setdefault(wq_sample.station, []).append(wq_sample)
 
   def __getitem__(self, name):
       return self._wq_samples[name]
@@ -84,67 +87,81 @@ class WQSamplesCollection:
   def items(self):
       return self._wq_samples.items()
 
+  def sort_by_date(self):
+      '''
+      Sorts each station's samples in place, oldest first. build_site_features used to do this as a
+      side effect, it no longer does, so callers that rely on date ordered samples call this.
+      '''
+      for samples in self._wq_samples.values():
+        samples.sort(key=lambda x: x.date_time)
+
 class WQAdvisoriesFile:
   def __init__(self, sample_sites):
     self.logger = logging.getLogger(self.__class__.__name__)
     self.sample_sites = sample_sites
+    #Site name -> extents GeoJSON feature. The extents don't change, so each one is only
+    #converted the first time it's written.
+    self._site_extents = {}
+
+  def extents_json(self, site):
+    extents_json = self._site_extents.get(site.name)
+    if extents_json is None and site.extents_geometry is not None:
+      extents_json = geojson.Feature(geometry=site.extents_geometry, properties={})
+      self._site_extents[site.name] = extents_json
+    return extents_json
 
   def create_file(self, out_file_name, wq_samples):
     try:
-      current_sample_sites = wq_samples.keys()
-      with open(out_file_name, 'r') as station_json_file:
-        json_data = json.loads(station_json_file.read())
-        if 'features' in json_data:
-          for site in self.sample_sites:
-            self.logger.debug("Searching for site: %s in json data" % (site.name))
-            site_found = False
-            features = json_data['features']
-            for feature in features:
-              properties = feature['properties']
-              station = properties['station']
-              if site.name == station:
-                self.logger.debug("Found site: %s" % (site.name))
-                site_found = True
-                site_nfo = site
-                """
-                for site in self.sample_sites:
-                  if site.name == station:
-                    site_nfo = site
-                    break
-                """
-                if station in current_sample_sites:
-                  self.logger.debug("Adding data for site: %s" % (site.name))
-                  wq_samples[station].sort(key=lambda x: x.date_time, reverse=False)
-
-                  if 'test' in properties:
-                    properties['test']['beachadvisories'] = {
-                      'date': wq_samples[station][-1].date_time.strftime('%Y-%m-%d %H:%M:%S'),
-                      'station': station,
-                      'value': wq_samples[station][-1].value
-                    }
-
-                break
-            if site_nfo is not None:
-              #Update the description fields since we might modify them
-              #from time to time, otherwise have to hand edit the json files.
-              properties['locale'] = site_nfo.description
-              properties['desc'] = site_nfo.description
-              if site_nfo is not None and site_nfo.extents_geometry is not None:
-                self.logger.debug("Adding extents for site: %s" % (site.name))
-                extents_json = geojson.Feature(geometry=site.extents_geometry, properties={})
-                feature['properties']['extents_geometry'] = extents_json
-
-            if not site_found:
-              self.logger.debug("Site: %s not found, building feature" % (site.name))
-              feature = self.build_feature(site, "", [])
-              features.append(feature)
-        else:
-          self.logger.debug("Features not found in json data, building")
-          features = self.build_site_features(wq_samples)
+      current_sample_sites = set(wq_samples.keys())
+      #Every feature is written back out, so the file is parsed in one go and closed
+      #before the features are updated.
+      with open(out_file_name, 'rb') as station_json_file:
+        json_data = json_utils.loads(station_json_file.read())
+      if 'features' in json_data:
+        features = json_data['features']
+        #Index the features by station so each site is a dict lookup rather than a scan of the
+        #features. If a station is in the file more than once, the first one is used.
+        feature_by_station = {}
+        for feature in features:
+          feature_by_station.setdefault(feature['properties']['station'], feature)
+        for site in self.sample_sites:
+          self.logger.debug("Searching for site: %s in json data" % (site.name))
+          feature = feature_by_station.get(site.name)
+          if feature is not None:
+            self.logger.debug("Found site: %s" % (site.name))
+            properties = feature['properties']
+            station = properties['station']
+            if station in current_sample_sites:
+              self.logger.debug("Adding data for site: %s" % (site.name))
+
+              if 'test' in properties:
+                latest_sample = max(wq_samples[station], key=lambda x: x.date_time)
+                properties['test']['beachadvisories'] = {
+                  'date': sample_date_string(latest_sample.date_time),
+                  'station': station,
+                  'value': latest_sample.value
+                }
+
+            #Update the description fields since we might modify them
+            #from time to time, otherwise have to hand edit the json files.
+            properties['locale'] = site.description
+            properties['desc'] = site.description
+            if site.extents_geometry is not None:
+              self.logger.debug("Adding extents for site: %s" % (site.name))
+              properties['extents_geometry'] = self.extents_json(site)
+          else:
+            self.logger.debug("Site: %s not found, building feature" % (site.name))
+            feature = self.build_feature(site, "", [])
+            features.append(feature)
+      else:
+        self.logger.debug("Features not found in json data, building")
+        features = self.build_site_features(wq_samples)
     except (IOError, Exception) as e:
       self.logger.error("File: %s does not exist yet." % (out_file_name))
       features = self.build_site_features(wq_samples)
     try:
+      #Written with the json module so the published layout, separators and ASCII escaping,
+      #stays the same whether or not orjson is installed.
       with open(out_file_name, "w") as out_file_obj:
         #features = self.build_site_features(wq_samples)
         json_data = {
@@ -190,27 +207,22 @@ class WQAdvisoriesFile:
         }
       }
     }
-    extents_json = None
     if site.extents_geometry is not None:
-      extents_json = geojson.Feature(geometry=site.extents_geometry, properties={})
-      feature['properties']['extents_geometry'] = extents_json
+      feature['properties']['extents_geometry'] = self.extents_json(site)
 
     return feature
 
   def build_site_features(self, wq_samples):
     start_time = time.time()
     self.logger.debug("Starting build_feature_logger")
-    #Sort the data based on the date time of the sample(s).
-    for site in wq_samples:
-      wq_samples[site].sort(key=lambda x: x.date_time, reverse=False)
-
     features = []
     for site in self.sample_sites:
       bacteria_data = {}
       if site.name in wq_samples:
+        #Only the most recent sample is used, no need to sort the site's samples for it.
         site_data = wq_samples[site.name]
-        bacteria_data = site_data[-1]
-        feature = self.build_feature(site, bacteria_data.date_time.strftime('%Y-%m-%d %H:%M:%S'), [bacteria_data.value])
+        bacteria_data = max(site_data, key=lambda x: x.date_time)
+        feature = self.build_feature(site, sample_date_string(bacteria_data.date_time), [bacteria_data.value])
       else:
         feature = self.build_feature(site, "", [])
 
@@ -225,42 +237,92 @@ class WQStationAdvisoriesFile:
     self.logger = logging.getLogger(self.__class__.__name__)
     self.sample_site = sample_site
 
+  @classmethod
+  def create_files(cls, sample_sites, out_file_directory, wq_samples, max_workers=8):
+    '''
+    Creates or updates the station file for each of the sample_sites. Each station is its own
+    file, so the reads and writes are run on a thread pool rather than one station after another.
+    Stations whose names clean to the same file name are updated one after another by the same
+    worker, so two workers never read and rewrite one file at the same time.
+    :param sample_sites: Sites to write station files for.
+    :param out_file_directory: Directory the station files are in.
+    :param wq_samples: The WQSamplesCollection to add to the files.
+    :param max_workers: Most files worked on at once.
+    :return:
+    '''
+    file_groups = {}
+    for site in sample_sites:
+      station_file = cls(site)
+      file_groups.setdefault(station_file.station_filename(out_file_directory), []).append(station_file)
+    if not file_groups:
+      return
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(file_groups))) as executor:
+      #Submit every file before waiting on any of them, create_file logs its own errors.
+      futures = [executor.submit(cls._create_group_files, station_files, out_file_directory, wq_samples)
+                 for station_files in file_groups.values()]
+      for future in futures:
+        future.result()
+
+  @staticmethod
+  def _create_group_files(station_files, out_file_directory, wq_samples):
+    for station_file in station_files:
+      station_file.create_file(out_file_directory, wq_samples)
+
+  def station_filename(self, out_file_directory):
+    cleaned_name = safe_filename(self.sample_site.name.name)
+    return os.path.join(out_file_directory, f"{cleaned_name}.json")
+
   def create_file(self, out_file_directory, wq_samples):
     start_time = time.time()
     self.logger.debug("Starting create_file")
-    cleaned_name = safe_filename(self.sample_site.name.name)
-    station_filename = os.path.join(out_file_directory, f"{cleaned_name}.json")
-    beach_advisories = []
+    station_filename = self.station_filename(out_file_directory)
+    samples = []
     if self.sample_site.name in wq_samples:
       samples = wq_samples[self.sample_site.name]
-      for sample in samples:
-        beach_advisories.append({
-          'date': sample.date_time.strftime('%Y-%m-%d %H:%M:%S'),
-          'station': self.sample_site.name,
-          'value': [sample.value]
-        })
+    feature = None
+    file_changed = True
     if os.path.isfile(station_filename) and os.stat(station_filename).st_size > 0:
       try:
         self.logger.debug("Opening station JSON file: %s" % (station_filename))
-        with open(station_filename, 'r') as station_json_file:
-          feature = json.loads(station_json_file.read())
+        with open(station_filename, 'rb') as station_json_file:
+          feature = json_utils.loads(station_json_file.read())
           if feature is not None:
             if 'test' in feature['properties']:
               file_beachadvisories = feature['properties']['test']['beachadvisories']
             else:
               file_beachadvisories = []
-            # Make sure the date is not already in the list.
-            for test_data in beach_advisories:
-              if not contains(file_beachadvisories, lambda x: x['date'] == test_data['date']):
-                self.logger.debug("Station: %s adding date: %s" % (self.sample_site.name, test_data['date']))
-                file_beachadvisories.append(test_data)
-                file_beachadvisories.sort(key=lambda x: x['date'], reverse=False)
+            # Make sure the date is not already in the list, only samples with a new date
+            # get an advisory entry built.
+            existing_dates = {x['date'] for x in file_beachadvisories}
+            new_advisories = []
+            for sample in samples:
+              sample_date = sample_date_string(sample.date_time)
+              if sample_date not in existing_dates:
+                self.logger.debug("Station: %s adding date: %s" % (self.sample_site.name, sample_date))
+                existing_dates.add(sample_date)
+                new_advisories.append({
+                  'date': sample_date,
+                  'station': self.sample_site.name,
+                  'value': [sample.value]
+                })
+            if new_advisories:
+              file_beachadvisories.extend(new_advisories)
+              file_beachadvisories.sort(key=lambda x: x['date'], reverse=False)
+            else:
+              self.logger.debug("Station: %s no new dates, file unchanged" % (self.sample_site.name))
+              file_changed = False
       except (IOError, Exception) as e:
         if self.logger:
           self.logger.exception(e)
     else:
       self.logger.debug("Creating new station JSON file for: %s" % (self.sample_site.name))
 
+      #Samples can come in any order, keep a new file's advisories in date order.
+      beach_advisories = [{
+          'date': sample_date_string(sample.date_time),
+          'station': self.sample_site.name,
+          'value': [sample.value]
+        } for sample in sorted(samples, key=lambda x: x.date_time)]
       feature = {
         'type': 'Feature',
         'geometry': {
@@ -285,13 +347,14 @@ class WQStationAdvisoriesFile:
         extents_json = geojson.Feature(geometry=self.sample_site.extents_geometry, properties={})
         feature['properties']['extents_geometry'] = extents_json
     try:
-      if feature is not None:
+      if feature is not None and file_changed:
         self.logger.debug("Creating file: %s" % (station_filename))
+        #Written with the json module to keep the published layout, see WQAdvisoriesFile.create_file.
         with open(station_filename, 'w') as station_json_file:
           feature_json = json.dumps(feature)
           #self.logger.debug("Feature: %s" % (feature_json))
           station_json_file.write(feature_json)
-      else:
+      elif feature is None:
         self.logger.error("Feature is None")
     except (IOError, Exception) as e:
       self.logger.exception(e)
@@ -0,0 +1,83 @@
+"""
+named_list
+List base class for items with a name attribute, with a case insensitive lookup by name.
+"""
+
+
+class NamedItemList(list):
+    """
+    The lower cased name to item index is built on the first lookup and append keeps it current.
+    Any other change to the list, reordering included, drops it and the next lookup rebuilds it.
+    If two items have the same name, the first one in the list wins.
+    """
+    _by_lower = None
+
+    def get_by_name(self, name):
+        if self._by_lower is None:
+            by_lower = {}
+            for item in self:
+                by_lower.setdefault(item.name.lower(), item)
+            self._by_lower = by_lower
+        return self._by_lower.get(name.lower())
+
+    def _invalidate(self):
+        self._by_lower = None
+
+    def append(self, item):
+        list.append(self, item)
+        if self._by_lower is not None:
+            self._by_lower.setdefault(item.name.lower(), item)
+
+    def extend(self, items):
+        list.extend(self, items)
+        self._invalidate()
+
+    def insert(self, index, item):
+        list.insert(self, index, item)
+        self._invalidate()
+
+    def remove(self, item):
+        list.remove(self, item)
+        self._invalidate()
+
+    def pop(self, index=-1):
+        item = list.pop(self, index)
+        self._invalidate()
+        return item
+
+    def clear(self):
+        list.clear(self)
+        self._invalidate()
+
+    def sort(self, *args, **kwargs):
+        list.sort(self, *args, **kwargs)
+        self._invalidate()
+
+    def reverse(self):
+        list.reverse(self)
+        self._invalidate()
+
+    def __setitem__(self, index, item):
+        list.__setitem__(self, index, item)
+        self._invalidate()
+
+    def __delitem__(self, index):
+        list.__delitem__(self, index)
+        self._invalidate()
+
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+
+    def __imul__(self, count):
+        list.__imul__(self, count)
+        self._invalidate()
+        return self
+
+    def __copy__(self):
+        # The default copy would share the index dict with the original.
+        copied = self.__class__.__new__(self.__class__)
+        copied.__dict__.update(self.__dict__)
+        copied._by_lower = None
+        list.extend(copied, self)
+        return copied
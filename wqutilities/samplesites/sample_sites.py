@@ -1,9 +1,8 @@
-class SamplingSites(list):
+from .named_list import NamedItemList
+
+class SamplingSites(NamedItemList):
   def load_sites(self, **kwargs):
     return False
 
   def get_site(self, site_name):
-    for site in self:
-      if site.name.lower() == site_name.lower():
-        return site
-    return None
+    return self.get_by_name(site_name)
@@ -1,6 +1,7 @@
-from shapely.wkt import loads as wkt_loads
+from shapely import from_wkt
 import csv
 import logging.config
+from .named_list import NamedItemList
 
 logger = logging.getLogger(__name__)
 
@@ -11,10 +12,14 @@ COntains name of boundary and the geometry that localizes it, usually a WKT POly
 
 
 class ItemGeometry:
-    def __init__(self, name, wkt=None):
+    __slots__ = ('name', 'object_geometry')
+
+    def __init__(self, name, wkt=None, geometry=None):
         self.name = name  # Name for the object
-        if wkt is not None:
-            self.object_geometry = wkt_loads(wkt)  # Shapely object
+        if geometry is not None:
+            self.object_geometry = geometry  # Already parsed, used as is.
+        elif wkt is not None:
+            self.object_geometry = from_wkt(wkt)  # Shapely object
 
 
 """
@@ -24,8 +29,10 @@ COntains name of sample site and the geometry that localizes it, usually a WKT P
 
 
 class StationGeometry(ItemGeometry):
-    def __init__(self, name, wkt=None):
-        ItemGeometry.__init__(self, name, wkt)
+    __slots__ = ('contained_by',)
+
+    def __init__(self, name, wkt=None, geometry=None):
+        ItemGeometry.__init__(self, name, wkt, geometry)
         self.contained_by = []  # THe boundaries that the station resides in.
 
     def add_boundary(self, name, wkt):
@@ -38,7 +45,7 @@ Class that loads simple CSV file containing the WKT and NAME of polygon boundari
 """
 
 
-class GeometryList(list):
+class GeometryList(NamedItemList):
     """
     Function: load
     Purpose: Loads the given CSV file, file_name, and creates a list of the boundary objects.
@@ -50,31 +57,44 @@ class GeometryList(list):
     def load(self, file_name):
         header_row = ["WKT", "NAME"]
         try:
-            geometry_file = open(file_name, "r")
+            geometry_file = open(file_name, "r", newline='', buffering=1024 * 1024)
         except (IOError, Exception) as e:
             logger.exception(e)
         else:
             line_num = 0
             try:
                 logger.debug(f"Open boundary file: {file_name}")
-                dict_file = csv.DictReader(geometry_file, delimiter=',', quotechar='"', fieldnames=header_row)
-
-                for row in dict_file:
-                    if line_num > 0:
-                        logger.debug(f"Building boundary polygon for: {row['NAME']}")
-                        self.append(ItemGeometry(row['NAME'], row['WKT']))
-                    line_num += 1
-
-                return True
-
+                with geometry_file:
+                    dict_file = csv.DictReader(geometry_file, delimiter=',', quotechar='"', fieldnames=header_row)
+
+                    names = []
+                    wkts = []
+                    for row in dict_file:
+                        if line_num > 0:
+                            names.append(row['NAME'])
+                            wkts.append(row['WKT'])
+                        line_num += 1
             except (IOError, Exception) as e:
                 logger.error(f"Geometry creation issue on line: {line_num}")
                 logger.exception(e)
+            else:
+                try:
+                    # Parse all the boundaries in one call instead of one per row. A malformed WKT
+                    # comes back as None so only that row is skipped.
+                    geometries = from_wkt(wkts, on_invalid='ignore')
+                except Exception as e:
+                    logger.error(f"Geometry creation issue in file: {file_name}")
+                    logger.exception(e)
+                else:
+                    for line_num, (name, geometry) in enumerate(zip(names, geometries), start=1):
+                        if geometry is None:
+                            logger.error(f"Geometry creation issue on line: {line_num} boundary: {name}")
+                            continue
+                        logger.debug(f"Building boundary polygon for: {name}")
+                        self.append(ItemGeometry(name, geometry=geometry))
+                    return True
 
         return False
 
     def get_geometry_item(self, name):
-        for geometry_item in self:
-            if geometry_item.name.lower() == name.lower():
-                return geometry_item
-        return None
+        return self.get_by_name(name)
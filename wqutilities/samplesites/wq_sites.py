@@ -1,33 +1,47 @@
 import csv
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate
 
 import logging.config
 from .sample_sites import SamplingSites
 from .station_geometry import StationGeometry, GeometryList
-from shapely.wkt import loads as wkt_loads
+from shapely import from_wkt, get_coordinates, get_num_coordinates
 from shapely.geometry import mapping
 
 logger = logging.getLogger(__name__)
 
 
 class WQSite(StationGeometry):
+    __slots__ = ('epa_id', 'description', 'county', 'extents_geometry', '_extents_coords')
+
     def __init__(self, **kwargs):
-        StationGeometry.__init__(self, kwargs['name'], kwargs['wkt'])
+        StationGeometry.__init__(self, kwargs['name'], kwargs.get('wkt'), kwargs.get('geometry'))
         self.epa_id = kwargs.get('epa_id', "")
         self.description = kwargs.get('description', "")
         self.county = kwargs.get('county', "")
-        self.extents_geometry = None
-        if 'extentswkt' in kwargs:
-            if kwargs['extentswkt'] is not None:
-                if "MULTILINESTRING" in kwargs['extentswkt']:
-                    self.extents_geometry = wkt_loads(kwargs['extentswkt'])
+        # geometry and extents_geometry take already parsed shapely objects in place of the WKT.
+        self.extents_geometry = kwargs.get('extents_geometry')
+        # The WKT type comes first, so only the prefix needs checking.
+        extents_wkt = kwargs.get('extentswkt')
+        if self.extents_geometry is None and extents_wkt and extents_wkt.startswith("MULTILINESTRING"):
+            self.extents_geometry = from_wkt(extents_wkt)
+        # Coordinates from get_extents_coords, mapped on the first call.
+        self._extents_coords = None
         return
 
     def get_extents_coords(self):
-        coords = None
-        if self.extents_geometry is not None:
-            mapped = mapping(self.extents_geometry)
-            coords = mapped['coordinates']
-        return coords
+        if self._extents_coords is None and self.extents_geometry is not None:
+            self._extents_coords = mapping(self.extents_geometry)['coordinates']
+        return self._extents_coords
+
+    def get_extents_xy(self):
+        """
+        Returns the extents vertices as an (N, 2) float array straight from GEOS, without
+        building the nested GeoJSON coordinate lists get_extents_coords returns.
+        """
+        if self.extents_geometry is None:
+            return None
+        return get_coordinates(self.extents_geometry)
 
 
 """
@@ -48,54 +62,102 @@ class WQSampleSites(SamplingSites):
 
     def load_sites(self, **kwargs):
         wq_boundaries = None
+        boundaries_loaded = None
         if 'file_name' in kwargs:
             if 'boundary_file' in kwargs:
                 wq_boundaries = GeometryList()
-                wq_boundaries.load(kwargs['boundary_file'])
+                # The boundaries aren't needed until the sites are built, so they load on a worker
+                # thread while the sites file is read and its WKT parsed.
+                boundary_executor = ThreadPoolExecutor(max_workers=1)
+                boundaries_loaded = boundary_executor.submit(wq_boundaries.load, kwargs['boundary_file'])
+                boundary_executor.shutdown(wait=False)
 
             try:
                 header_row = ["WKT", "EPAbeachID", "SPLocation", "Description", "County", "Boundary", "ExtentsWKT"]
                 logger.debug(f"Reading sample sites file: {kwargs['file_name']}")
 
-                sites_file = open(kwargs['file_name'], "r")
-                dict_file = csv.DictReader(sites_file, delimiter=',', quotechar='"', fieldnames=header_row)
+                # newline='' is what the csv module expects, and the larger buffer cuts down the reads
+                # on big sites files.
+                sites_file = open(kwargs['file_name'], "r", newline='', buffering=1024 * 1024)
+                # Columns are fixed, in header_row order, so rows are read as lists not dicts.
+                sites_reader = csv.reader(sites_file, delimiter=',', quotechar='"')
             except IOError as e:
                 logger.exception(e)
             else:
-                line_num = 0
-                for row in dict_file:
-                    if line_num > 0:
-                        add_site = False
+                # First pass picks out the rows for new sites, then the WKT for all of them is
+                # parsed in one from_wkt call per column rather than once per row.
+                rows = []
+                new_names = set()
+                column_count = len(header_row)
+                with sites_file:
+                    get_site = self.get_site
+                    # Skip the header row.
+                    next(sites_reader, None)
+                    for row in sites_reader:
+                        if not row:
+                            # Blank line, skipped the way DictReader skipped them.
+                            continue
+                        if len(row) < column_count:
+                            # Missing trailing columns read as None.
+                            row += [None] * (column_count - len(row))
+                        sp_location = row[2]
                         # The site could be in multiple boundaries, so let's search to see if it is.
-                        station = self.get_site(row['SPLocation'])
-                        if station is None:
-                            add_site = True
-                            extents_wkt = None
-                            if 'ExtentsWKT' in row:
-                                extents_wkt = row['ExtentsWKT']
-                            station = WQSite(name=row['SPLocation'],
-                                             wkt=row['WKT'],
-                                             epa_id=row['EPAbeachID'],
-                                             description=row['Description'],
-                                             county=row['County'],
-                                             extentswkt=extents_wkt)
-                            logger.debug(f"Processing sample site: {row['SPLocation']}")
-                            self.append(station)
-                            try:
-                                if len(row['Boundary']):
-                                    boundaries = row['Boundary'].split(',')
-                                    for boundary in boundaries:
-                                        logger.debug("Sample site: {row['SPLocation']} Boundary: {boundary}")
-                                        boundary_geometry = wq_boundaries.get_geometry_item(boundary)
-                                        if add_site:
-                                            # Add the containing boundary
-                                            station.contained_by.append(boundary_geometry)
-                            except AttributeError as e:
-                                logger.exception(e)
-                    line_num += 1
+                        name_key = sp_location.lower()
+                        if name_key not in new_names and get_site(sp_location) is None:
+                            new_names.add(name_key)
+                            rows.append(row)
+
+                geometries = from_wkt([row[0] for row in rows])
+                extents_ndx = [ndx for ndx, row in enumerate(rows)
+                               if row[6] and row[6].startswith("MULTILINESTRING")]
+                extents_geometries = dict(zip(extents_ndx, from_wkt([rows[ndx][6] for ndx in extents_ndx])))
+
+                if boundaries_loaded is not None:
+                    boundaries_loaded.result()
+
+                append = self.append
+                # Without a boundary file the Boundary column is ignored.
+                has_boundaries = wq_boundaries is not None
+                if has_boundaries:
+                    get_geometry_item = wq_boundaries.get_geometry_item
+                # Checked once so the per row debug messages aren't formatted when they won't be logged.
+                debug = logger.isEnabledFor(logging.DEBUG)
+                for ndx, row in enumerate(rows):
+                    wkt, epa_id, sp_location, description, county, boundary_names, extents_wkt = row[:column_count]
+                    station = WQSite(name=sp_location,
+                                     geometry=geometries[ndx],
+                                     epa_id=epa_id,
+                                     description=description,
+                                     county=county,
+                                     extents_geometry=extents_geometries.get(ndx))
+                    if debug:
+                        logger.debug(f"Processing sample site: {sp_location}")
+                    append(station)
+                    if has_boundaries and boundary_names:
+                        # Most sites sit in a single boundary, only split when there is more than one.
+                        boundaries = boundary_names.split(',') if ',' in boundary_names else (boundary_names,)
+                        contained_by_append = station.contained_by.append
+                        for boundary in boundaries:
+                            boundary = boundary.strip()
+                            if debug:
+                                logger.debug(f"Sample site: {sp_location} Boundary: {boundary}")
+                            boundary_geometry = get_geometry_item(boundary)
+                            # Add the containing boundary
+                            contained_by_append(boundary_geometry)
                 return True
         return False
 
+    def extents_as_soa(self):
+        """
+        Returns the extents vertices of all the sites as one (N, 2) array plus a list of offsets, the
+        vertices for the site at index i are coords[offsets[i]:offsets[i + 1]]. Sites without extents
+        have no vertices.
+        """
+        geometries = [getattr(site, 'extents_geometry', None) for site in self]
+        coords = get_coordinates(geometries)
+        offsets = list(accumulate(get_num_coordinates(geometries), initial=0))
+        return coords, offsets
+
     def add_site(self, site: WQSite):
         if self.get_site(site.name) is None:
             self.append(site)
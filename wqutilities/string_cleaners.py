@@ -1,9 +1,15 @@
-import re
+import functools
+
+# Characters not allowed in Windows filenames: \ / : * ? " < > | plus the control characters.
+_UNSAFE_CHARS = '<>:"/\\|?*' + ''.join(chr(c) for c in range(0x20))
+
+@functools.lru_cache(maxsize=8)
+def _unsafe_table(replacement: str) -> dict:
+    return str.maketrans({c: replacement for c in _UNSAFE_CHARS})
 
 def safe_filename(name: str, replacement: str = "_") -> str:
     """
     Remove characters that are invalid for filenames across Windows, macOS, and Linux.
     """
-    # Characters not allowed in Windows filenames: \ / : * ? " < > |
-    # Also remove control characters and strip whitespace at ends
-    return re.sub(r'[<>:"/\\|?*\x00-\x1F]', replacement, name).strip()
\ No newline at end of file
+    # Strip whitespace at ends after the replacement.
+    return name.translate(_unsafe_table(replacement)).strip()
\ No newline at end of file